@@ -1,99 +1,261 @@
 import time
-from queue import Queue
+# taken before the other imports so that the startup report includes them
+STARTED = time.perf_counter()
+
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
-import imutils
-from imutils.video import FPS, VideoStream, FileVideoStream
 
-from luma_device import LumaDevice
-from entry_tracker import EntryTracker
+from bounded_queue import BoundedQueue
+from camera import Camera
+from luma_device import LumaDevice, LumaProcessDevice
+from luma_region import LumaRegion
+from line_counter import LineCounter
+from metrics import NULL_METRICS, make_metrics
+from detector_calibration import make_detector
+from person_detector import AsyncDetector
 from telemetry import TelemetrySender
+from telemetry_transport import TelemetryTransport
 
 LUMA_DELAY = 120
 SHOW_VIDEO = True
+CAMERA_TIMEOUT = 30
 
 class App:
     def __init__(self):
-        self.telemetry_queue = Queue()
-        self.__setup_config()
-        self.__setup_video()
-        self.__setup_tracker()
-        self.__setup_luma_device()
-        self.__setup_telemetry_sender()
+        # seconds spent in each startup phase, the parallel ones overlap
+        self.startup = {"imports": time.perf_counter() - STARTED}
+        self.metrics = NULL_METRICS
+        self.cameras = []
+        self.telemetry_sender = None
+        self.async_detector = None
+        self.tracker_pool = None
+        self.luma_device = None
+        try:
+            self.__setup()
+        except BaseException:
+            # setup has started non-daemon threads by now, left running they keep the process alive
+            self.__stop_started()
+            raise
+
+        self.startup["total"] = time.perf_counter() - STARTED
+        print("Startup (s):", " | ".join(f"{phase} {seconds:.2f}" for (phase, seconds) in self.startup.items()))
+
+        self.frames = 0
+        self.first_frame = True
+        self.started = time.perf_counter()
+
+    def __setup(self):
+        self.__timed("config", self.__setup_config)
+        self.metrics = make_metrics(self.config)
+        self.telemetry_queue = BoundedQueue.from_config(
+            self.config, 'telemetry', 1000, "block")
+        self.metrics.gauge("queue_depth", self.telemetry_queue.depth, queue="telemetry")
+        self.metrics.gauge("queue_dropped", lambda: self.telemetry_queue.dropped, queue="telemetry")
+
+        # opening the cameras, loading the network and connecting to the broker mostly wait
+        # on I/O, so they run side by side instead of one after the other
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(self.__timed, "tracker modules", self.__load_tracker_modules),
+                       pool.submit(self.__timed, "cameras", self.__setup_video),
+                       pool.submit(self.__timed, "detector", self.__setup_detector),
+                       pool.submit(self.__timed, "telemetry", self.__setup_telemetry_sender)]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if len(errors) > 0:
+            raise errors[0]
+
+        self.__timed("trackers", self.__setup_tracker)
+        self.__timed("luma", self.__setup_luma_device)
+
+    def __timed(self, phase, setup):
+        start = time.perf_counter()
+        setup()
+        self.startup[phase] = time.perf_counter() - start
+
+    def __stop_started(self):
+        for camera in self.cameras:
+            camera.stop()
+        if self.async_detector is not None:
+            self.async_detector.stop()
+        if self.tracker_pool is not None:
+            self.tracker_pool.shutdown()
+        if self.luma_device is not None:
+            self.luma_device.stop()
+        if self.telemetry_sender is not None:
+            self.telemetry_sender.stop()
+        self.metrics.stop()
 
     def __setup_config(self):
         with open("config.json", "r") as cfg:
             self.config = json.load(cfg)
 
+    def __load_tracker_modules(self):
+        # dlib takes a while to import, done while the cameras and the network start
+        import entry_tracker
+
     def __setup_video(self):
-        self.vs = FileVideoStream(path=self.config['cam_addr']).start()
-        
-        time.sleep(2)
-        while self.__get_frame() is None:
-            continue
-        self.frame_height, self.frame_width = self.__get_frame().shape[:2]
-        self.fps = FPS().start()
-        self.total_frames = 0
+        self.cameras = Camera.from_config(self.config, self.metrics)
+
+        for camera in self.cameras:
+            camera.wait_ready(self.config.get('camera_timeout', CAMERA_TIMEOUT))
+        # luma is sampled from the first camera only
+        self.frame_height = self.cameras[0].frame_height
+        self.frame_width = self.cameras[0].frame_width
+
+    def __setup_detector(self):
+        # the input size of the network does not depend on the frames, they are not needed yet
+        self.detector = make_detector(self.config, None, None)
+        self.detector.warm_up()
 
     def __setup_tracker(self):
-        self.entry_tracker = EntryTracker(
-            self.frame_width, self.frame_height, self.config['net_confidence'], self.telemetry_queue)
+        from entry_tracker import EntryTracker
+
+        if self.config.get('async_detection', False) or len(self.cameras) > 1:
+            self.async_detector = AsyncDetector(self.detector, self.metrics)
+
+        tracker_workers = self.config.get('tracker_workers', 1)
+        self.tracker_pool = ThreadPoolExecutor(
+            tracker_workers) if tracker_workers > 1 else None
+
+        for camera in self.cameras:
+            line_counter = LineCounter.from_config(
+                camera.config, camera.frame_width, camera.frame_height)
+            camera.entry_tracker = EntryTracker(
+                camera.frame_width, camera.frame_height, self.telemetry_queue, self.detector,
+                None if self.async_detector is None else self.async_detector.client(), camera.entry_at,
+                self.tracker_pool, line_counter, self.config.get('centroid_engine', "greedy"),
+                detection_crop=EntryTracker.crop_from_config(camera.config, line_counter), metrics=camera.metrics)
 
     def __setup_luma_device(self):
-        self.luma_frame_queue = Queue()
-        self.luma_device = LumaDevice(
-            self.luma_frame_queue, self.telemetry_queue)
+        self.luma_frame_queue = BoundedQueue.from_config(
+            self.config, 'luma', 2, "drop_oldest")
+        self.metrics.gauge("queue_depth", self.luma_frame_queue.depth, queue="luma")
+        self.metrics.gauge("queue_dropped", lambda: self.luma_frame_queue.dropped, queue="luma")
+        self.luma_regions = LumaRegion.from_config(
+            self.config, self.frame_width, self.frame_height)
+        if self.config.get('luma_backend', "thread") == "process":
+            self.luma_device = LumaProcessDevice(
+                self.luma_frame_queue, self.telemetry_queue, self.frame_width * self.frame_height * 3, self.config.get('luma_window', 0),
+                metrics=self.metrics)
+        else:
+            self.luma_device = LumaDevice(
+                self.luma_frame_queue, self.telemetry_queue, self.config.get('luma_window', 0), self.metrics)
         self.luma_last_frame = time.time()
+        self.luma_delay = self.config.get('luma_delay', LUMA_DELAY)
+        self.show_video = self.config.get('show_video', SHOW_VIDEO)
 
     def __setup_telemetry_sender(self):
         self.telemetry_sender = TelemetrySender(
-            self.config['iot_server_addr'], self.config['entry_at'], self.config['luma_at'], self.telemetry_queue)
-
-    def __get_frame(self):
-        frame = self.vs.read()
-        return None if frame is None else imutils.resize(frame, width=402)
+            TelemetryTransport.from_config(self.config), self.telemetry_queue,
+            self.config.get('telemetry_batch_size', 32), self.config.get('telemetry_flush_interval', 0.05),
+            self.config.get('telemetry_spool'), self.metrics)
 
     def run(self):
         while 1:
-            frame = self.__get_frame()
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            if time.time() - self.luma_last_frame > LUMA_DELAY:
-                self.luma_frame_queue.put(frame.copy())
-                self.luma_last_frame = time.time()
-
-            coords = self.entry_tracker.process(
-                frame, rgb, self.total_frames % self.config['skip_frames'] == 0)
-            
-            if SHOW_VIDEO:
-                for (x, y) in coords:
-                    cv2.circle(frame, (x, y), 4, (255, 255, 255), -1)
-
-                cv2.line(frame, (0, self.frame_height // 2),
-                        (self.frame_width, self.frame_height // 2), (0, 0, 0), 2)
-                
-                cv2.imshow("ICS-project", frame)
+            for camera in self.cameras:
+                if not self.__process_camera(camera):
+                    return
+            if self.async_detector is not None:
+                # refresh frames of every camera in this round go through one forward pass
+                self.async_detector.flush()
+            if self.first_frame:
+                print(f"First frame after {time.perf_counter() - STARTED:.2f} s")
+                self.first_frame = False
+
+            if self.show_video:
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
                     break
 
-            self.total_frames += 1
-            self.fps.update()
+    def __process_camera(self, camera):
+        metrics = camera.metrics
+        with metrics.time("capture"):
+            frame = camera.capture.read()
+        if frame is None:
+            return False
+        metrics.inc("frames_total")
 
-    def __del__(self):
-        self.fps.stop()
-        self.vs.stop()
-        
-        while not self.telemetry_queue.empty:
-            continue
+        if camera is self.cameras[0] and time.time() - self.luma_last_frame > self.luma_delay:
+            self.luma_frame_queue.put(
+                [(region.name, region.extract(frame)) for region in self.luma_regions])
+            self.luma_last_frame = time.time()
 
-        print("Average fps:", self.fps.fps())
-        print("Elapsed time:", self.fps.elapsed())
-        
-        if SHOW_VIDEO:
-            cv2.destroyAllWindows()
+        if camera.idle_gate is not None and not camera.idle_gate.active(frame, camera.entry_tracker):
+            camera.total_frames += 1
+            self.frames += 1
+            return True
+
+        with metrics.time("color"):
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=camera.rgb)
+        with metrics.time("schedule"):
+            refresh = camera.scheduler.should_refresh(frame, camera.entry_tracker)
+        if camera.idle_gate is not None and camera.idle_gate.just_woke():
+            refresh = True
+
+        with metrics.time("process"):
+            coords = camera.entry_tracker.process(frame, rgb, refresh)
+        if camera.idle_gate is not None:
+            camera.idle_gate.processed()
+
+        if self.show_video:
+            self.__draw(camera, frame, coords)
+
+        camera.total_frames += 1
+        self.frames += 1
+        return True
+
+    def __draw(self, camera, frame, coords):
+        with camera.metrics.time("draw"):
+            for (x, y) in coords:
+                cv2.circle(frame, (x, y), 4, (255, 255, 255), -1)
 
+            line_counter = camera.entry_tracker.line_counter
+            for (p0, p1) in zip(line_counter.p0.astype("int"), line_counter.p1.astype("int")):
+                cv2.line(frame, tuple(p0), tuple(p1), (0, 0, 0), 2)
+            cv2.polylines(frame, [polygon.astype("int32") for polygon in line_counter.polygons],
+                          True, (0, 0, 0), 2)
+            if line_counter.history_size > 0:
+                trails = [line_counter.recent_centroids(object_id).astype("int32")
+                          for object_id in line_counter.ids]
+                cv2.polylines(frame, trails, False, (255, 255, 255), 1)
+
+            cv2.imshow(camera.name, frame)
+
+    def queue_stats(self):
+        return {
+            "luma queue depth": self.luma_frame_queue.depth(),
+            "luma queue dropped": self.luma_frame_queue.dropped,
+            "telemetry queue depth": self.telemetry_queue.depth(),
+            "telemetry queue dropped": self.telemetry_queue.dropped,
+            "capture dropped": sum(camera.capture.dropped for camera in self.cameras),
+            "capture lagged": sum(camera.capture.lagged for camera in self.cameras)
+        }
+
+    def stop(self):
+        elapsed = time.perf_counter() - self.started
+        for camera in self.cameras:
+            camera.stop()
+        if self.async_detector is not None:
+            self.async_detector.stop()
+        if self.tracker_pool is not None:
+            self.tracker_pool.shutdown()
+
+        self.luma_device.stop()
+        self.telemetry_sender.stop()
+
+        print("Average fps:", self.frames / elapsed if elapsed > 0 else 0.0)
+        print("Elapsed time:", elapsed)
+        print("Queues:", self.queue_stats())
+        print("Telemetry not sent:", self.telemetry_sender.failed)
+        for camera in self.cameras:
+            print(f"Detection decisions ({camera.name}):", dict(camera.scheduler.decisions))
+            if camera.idle_gate is not None:
+                print(f"Idle mode ({camera.name}):", camera.idle_gate.stats())
+
+        self.metrics.stop()
+        if self.show_video:
+            cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
@@ -101,6 +263,8 @@ if __name__ == "__main__":
 
     try:
         app.run()
-    except: 
-        del app
+    except KeyboardInterrupt:
+        pass
+    finally:
         print("\nClosing")
+        app.stop()
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+
+import cv2
+import numpy as np
+
+from bounded_queue import BoundedQueue
+from detection_scheduler import FixedScheduler, make_scheduler
+from detector_calibration import detector_options, make_detector
+from entry_tracker import EntryTracker
+from idle_gate import IdleGate
+from line_counter import LineCounter
+from luma_device import LumaProcessor
+from luma_region import LumaRegion
+from telemetry import TelemetryType, TelemetryWrapper
+from telemetry_transport import FileTransport
+
+FRAME_WIDTH = 402
+LUMA_DELAY = 120
+
+
+class VideoClock:
+    def __init__(self, start_time: datetime) -> None:
+        self.start_time = start_time
+        self.position = 0.0
+
+    def __call__(self) -> datetime:
+        return self.start_time + timedelta(milliseconds=self.position)
+
+
+def video_info(path):
+    stream = cv2.VideoCapture(path)
+    if not stream.isOpened():
+        raise RuntimeError(f"Cannot read video from {path}")
+    frame_count = int(stream.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = stream.get(cv2.CAP_PROP_FPS) or 25.0
+    stream.release()
+    return frame_count, fps
+
+
+def split_frames(frame_count, chunks):
+    if frame_count <= 0:
+        return [(0, None)]
+    bounds = np.linspace(0, frame_count, min(chunks, frame_count) + 1).astype(int)
+    return [(int(first), int(last)) for (first, last) in zip(bounds[:-1], bounds[1:])]
+
+
+def process_chunk(path, config, options, start_time, first, last, overlap):
+    # frames before `first` only warm the tracker up, so that objects already in view at the
+    # chunk boundary have a history and are counted by exactly one chunk
+    stream = cv2.VideoCapture(path)
+    fps = stream.get(cv2.CAP_PROP_FPS) or 25.0
+    index = max(first - overlap, 0)
+    if index > 0:
+        stream.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    clock = VideoClock(start_time)
+    telemetry_queue = BoundedQueue()
+    luma_processor = LumaProcessor(config.get('luma_window', 0), clock)
+    luma_delay = config.get('luma_delay', LUMA_DELAY) * 1000
+    luma_sampled = None
+
+    frame = None
+    events = []
+    processed = 0
+    while last is None or index < last:
+        grabbed, raw = stream.read()
+        if not grabbed:
+            break
+        position = stream.get(cv2.CAP_PROP_POS_MSEC)
+        clock.position = position if position > 0 else index * 1000 / fps
+
+        if frame is None:
+            (h, w) = raw.shape[:2]
+            frame = np.empty((int(h * FRAME_WIDTH / float(w)), FRAME_WIDTH) + raw.shape[2:], dtype=raw.dtype)
+            rgb = np.empty_like(frame)
+            (frame_height, frame_width) = frame.shape[:2]
+            line_counter = LineCounter.from_config(config, frame_width, frame_height)
+            entry_tracker = EntryTracker(
+                frame_width, frame_height, telemetry_queue,
+                make_detector(config, frame_width, frame_height, options), None, config.get('entry_at'),
+                None, line_counter, config.get('centroid_engine', "greedy"), clock,
+                EntryTracker.crop_from_config(config, line_counter))
+            luma_regions = LumaRegion.from_config(config, frame_width, frame_height)
+            scheduler = make_scheduler(config)
+            if isinstance(scheduler, FixedScheduler):
+                # keep detections on the same frames as a single sequential pass
+                scheduler.frames = index
+            idle_gate = None
+            if config.get('idle_gate') is not None:
+                idle_gate = IdleGate(**config['idle_gate'])
+        cv2.resize(raw, (frame_width, frame_height), dst=frame, interpolation=cv2.INTER_AREA)
+
+        counted = index >= first
+        # a luma_delay of 0 samples every frame
+        luma_slot = index if luma_delay <= 0 else clock.position // luma_delay
+        if counted and luma_slot != luma_sampled:
+            for region in luma_regions:
+                telemetry = luma_processor.process(region.name, region.extract(frame))
+                if telemetry is not None:
+                    telemetry_queue.put(TelemetryWrapper(TelemetryType.T_LUMA, telemetry))
+        luma_sampled = luma_slot
+
+        if idle_gate is None or idle_gate.active(frame, entry_tracker):
+            refresh = scheduler.should_refresh(frame, entry_tracker)
+            if idle_gate is not None and idle_gate.just_woke():
+                refresh = True
+            entry_tracker.process(frame, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb), refresh)
+            if idle_gate is not None:
+                idle_gate.processed()
+
+        while not telemetry_queue.empty():
+            wrapped = telemetry_queue.get_nowait()
+            if counted:
+                events.append(wrapped)
+        processed += 1
+        index += 1
+
+    stream.release()
+    for telemetry in luma_processor.flush():
+        events.append(TelemetryWrapper(TelemetryType.T_LUMA, telemetry))
+    return events, processed
+
+
+def set_worker_threads():
+    # parallelism comes from the chunks, OpenCV's own pool would only oversubscribe the cores
+    cv2.setNumThreads(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count entries and sample luma from a recorded video as fast as possible")
+    parser.add_argument("video")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--output", help="NDJSON file, telemetry_file from the config by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunks", type=int, help="equal to the number of workers by default")
+    parser.add_argument("--overlap", type=float, default=10.0,
+                        help="seconds of video processed before each chunk to warm the tracker up")
+    parser.add_argument("--start-time", type=datetime.fromisoformat,
+                        help="wall-clock time of the first frame, file modification time minus duration by default")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as cfg:
+        config = json.load(cfg)
+
+    frame_count, fps = video_info(args.video)
+    start_time = args.start_time or datetime.fromtimestamp(
+        os.path.getmtime(args.video)) - timedelta(seconds=max(frame_count, 0) / fps)
+    chunks = split_frames(frame_count, args.chunks or args.workers)
+    overlap = int(args.overlap * fps)
+
+    start = time.perf_counter()
+    # calibrate once here rather than in every chunk
+    options = detector_options(config)
+    jobs = [(args.video, config, options, start_time, first, last, overlap) for (first, last) in chunks]
+    if args.workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(min(args.workers, len(jobs)), initializer=set_worker_threads) as pool:
+            results = list(pool.map(process_chunk, *zip(*jobs)))
+    else:
+        results = [process_chunk(*job) for job in jobs]
+    elapsed = time.perf_counter() - start
+
+    events = [wrapped for (chunk_events, _) in results for wrapped in chunk_events]
+    transport = FileTransport(args.output or config.get('telemetry_file', "telemetry.ndjson"))
+    transport.connect()
+    for (telemetry_type, batch) in groupby(events, key=lambda wrapped: wrapped.type):
+        transport.publish(telemetry_type, list(batch))
+    transport.disconnect()
+
+    frames = sum(processed for (_, processed) in results)
+    print("Chunks:", len(chunks))
+    print("Frames processed:", frames)
+    print("Elapsed time:", elapsed)
+    print("Average fps:", frames / elapsed if elapsed > 0 else 0.0)
+    print("Entries:", sum(wrapped.type == TelemetryType.T_ENTRY for wrapped in events))
+    print("Luma samples:", sum(wrapped.type == TelemetryType.T_LUMA for wrapped in events))
+
+
+if __name__ == "__main__":
+    main()
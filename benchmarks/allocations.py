@@ -0,0 +1,89 @@
+import argparse
+import gc
+import json
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks.pipeline import FixedDetector
+from benchmarks.trackers import synthetic_frames
+from bounded_queue import BoundedQueue
+from centroid_tracker import make_centroid_tracker
+from entry_tracker import EntryTracker
+from person_detector import PersonDetector
+
+
+def allocations(fn, repeat, warmup=5):
+    # buffers sized on the first calls are not churn, only the steady state is measured
+    for _ in range(warmup):
+        fn()
+
+    collections = gc.get_stats()[0]["collections"]
+    start = tracemalloc.get_traced_memory()[0]
+    transient = []
+    for _ in range(repeat):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        transient.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - start
+
+    return {"transient_kib": float(np.mean(transient)) / 1024, "max_transient_kib": max(transient) / 1024,
+            "retained_bytes": retained / repeat,
+            "gc_collections": (gc.get_stats()[0]["collections"] - collections) * 1000 / repeat}
+
+
+def stages(args):
+    frames, starts = synthetic_frames(args.repeat + 5, args.people)
+    frame = frames[0]
+    (height, width) = frame.shape[:2]
+    rgb = np.empty_like(frame)
+    boxes = [(int(x), int(y), int(x) + 40, int(y) + 80) for (x, y) in starts]
+
+    yield "cvtColor, new array", lambda: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    yield "cvtColor, dst buffer", lambda: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+
+    if not args.skip_detector:
+        detector = PersonDetector(width, height, 0.4)
+        yield "blobFromImages", lambda: cv2.dnn.blobFromImages([frame], 0.007843, detector.input_size, 127.5)
+        yield "PersonDetector.detect", lambda: detector.detect(frame)
+
+    for engine in ("greedy", "hungarian", "vectorized"):
+        centroid_tracker = make_centroid_tracker(engine, 40, 50)
+        yield f"centroid tracker, {engine}", lambda tracker=centroid_tracker: tracker.update(boxes)
+
+    entry_tracker = EntryTracker(width, height, BoundedQueue(), FixedDetector(boxes))
+    entry_tracker.process(frame, frame, True)
+    updated = iter(frames)
+
+    def update():
+        frame = next(updated)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        entry_tracker.process(frame, rgb, False)
+
+    yield f"EntryTracker frame, {args.people} people", update
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Heap allocations per call of the per-frame stages, traced with tracemalloc")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--people", type=int, default=8)
+    parser.add_argument("--skip-detector", action="store_true",
+                        help="do not load MobileNet-SSD")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    results = {}
+    print(f"{'stage':<36}{'KiB/call':>10}{'max KiB':>10}{'retained B':>12}{'gc/1k':>8}")
+    for (name, fn) in stages(args):
+        result = results[name] = allocations(fn, args.repeat)
+        print(f"{name:<36}{result['transient_kib']:>10.1f}{result['max_transient_kib']:>10.1f}"
+              f"{result['retained_bytes']:>12.1f}{result['gc_collections']:>8.1f}")
+    tracemalloc.stop()
+
+    if args.output is not None:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=4)
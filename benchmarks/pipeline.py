@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from benchmarks.telemetry_load import entry_telemetry
+from benchmarks.trackers import synthetic_frames
+from bounded_queue import BoundedQueue
+from centroid_tracker import make_centroid_tracker
+from detection_scheduler import make_scheduler
+from detector_calibration import make_detector
+from entry_tracker import EntryTracker
+from line_counter import LineCounter
+from luma_calculator import LumaCalculator
+from telemetry import TelemetrySender
+from telemetry_transport import MockTransport
+
+SEED = 0
+FRAME_WIDTH = 402
+# metrics where a larger value is an improvement, everything else is a latency or a size
+HIGHER_IS_BETTER = ("fps", "per_s")
+# the weights are downloaded separately, the detection benchmark is skipped without them
+MODEL = "mobilenet_ssd/MobileNetSSD_deploy.caffemodel"
+
+
+class FixedDetector:
+    def __init__(self, boxes) -> None:
+        self.boxes = boxes
+
+    def detect(self, frame):
+        return self.boxes
+
+
+def latency(samples):
+    samples = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99)),
+            "mean_ms": float(samples.mean()), "count": int(samples.size)}
+
+
+def timed(fn, repeat, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return latency(samples)
+
+
+def cumulative_peak_rss_mb():
+    # high-water mark of the whole process, so every benchmark includes the ones that ran before it
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def bench_luma(args):
+    frame = np.random.default_rng(SEED).integers(0, 256, (226, FRAME_WIDTH, 3), dtype=np.uint8)
+    return timed(lambda: LumaCalculator.calculate(frame), args.repeat)
+
+
+def bench_centroid(args, engine):
+    rng = np.random.default_rng(SEED)
+    starts = rng.integers(0, (FRAME_WIDTH - 40, 226 - 80), size=(args.people, 2))
+    steps = rng.integers(-2, 3, size=(args.people, 2))
+    frames = [[(int(x), int(y), int(x) + 40, int(y) + 80) for (x, y) in starts + i * steps]
+              for i in range(args.repeat + 3)]
+    centroid_tracker = make_centroid_tracker(engine, 40, 50)
+    rects = iter(frames)
+    return timed(lambda: centroid_tracker.update(next(rects)), args.repeat)
+
+
+def bench_entry_tracker(args, config):
+    frames, starts = synthetic_frames(args.repeat + 3, args.people, seed=SEED)
+    height, width = frames[0].shape[:2]
+    boxes = [(int(x), int(y), int(x) + 40, int(y) + 80) for (x, y) in starts]
+
+    def step(entry_tracker, frames, refresh):
+        frame = next(frames)
+        entry_tracker.process(frame, frame, refresh)
+
+    # fixed boxes leave only the tracker start after a refresh, without the network
+    entry_tracker = EntryTracker(width, height, BoundedQueue(), FixedDetector(boxes))
+    started, updated = iter(frames), iter(frames)
+    results = {"tracker_start": timed(lambda: step(entry_tracker, started, True), args.repeat),
+               "update": timed(lambda: step(entry_tracker, updated, False), args.repeat)}
+
+    if not os.path.isfile(MODEL):
+        print(f"  {MODEL} not found, skipping the refresh with the detector", flush=True)
+        return results
+    detecting = EntryTracker(width, height, BoundedQueue(), make_detector(config, width, height))
+    refreshed = iter(frames)
+    results["refresh"] = timed(lambda: step(detecting, refreshed, True), args.repeat)
+    return results
+
+
+def bench_telemetry_sender(args):
+    transport = MockTransport()
+    queue = BoundedQueue(1000)
+    sender = TelemetrySender(transport, queue)
+
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        queue.put(entry_telemetry())
+    sender.stop()
+    elapsed = time.perf_counter() - start
+    return {"messages_per_s": sender.sent / elapsed,
+            "queue_to_publish": latency(transport.latencies)}
+
+
+def bench_end_to_end(args, config):
+    stream = cv2.VideoCapture(args.video)
+    if not stream.isOpened():
+        raise RuntimeError(f"Cannot read video from {args.video}")
+
+    stages = defaultdict(list)
+    frame = entry_tracker = None
+    frames = 0
+    start = time.perf_counter()
+    while frames < args.frames:
+        t0 = time.perf_counter()
+        grabbed, raw = stream.read()
+        if not grabbed:
+            break
+        if frame is None:
+            (h, w) = raw.shape[:2]
+            frame = np.empty((int(h * FRAME_WIDTH / float(w)), FRAME_WIDTH) + raw.shape[2:], dtype=raw.dtype)
+            rgb = np.empty_like(frame)
+            (frame_height, frame_width) = frame.shape[:2]
+            telemetry_queue = BoundedQueue()
+            line_counter = LineCounter.from_config(config, frame_width, frame_height)
+            entry_tracker = EntryTracker(
+                frame_width, frame_height, telemetry_queue,
+                make_detector(config, frame_width, frame_height), line_counter=line_counter,
+                centroid_engine=config.get('centroid_engine', "greedy"),
+                detection_crop=EntryTracker.crop_from_config(config, line_counter))
+            scheduler = make_scheduler(config)
+            t0 = time.perf_counter()
+        cv2.resize(raw, (frame_width, frame_height), dst=frame, interpolation=cv2.INTER_AREA)
+        t1 = time.perf_counter()
+        stages["capture"].append(t1 - t0)
+
+        if frames % args.luma_every == 0:
+            LumaCalculator.calculate(frame)
+            stages["luma"].append(time.perf_counter() - t1)
+
+        t2 = time.perf_counter()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        refresh = scheduler.should_refresh(frame, entry_tracker)
+        t3 = time.perf_counter()
+        stages["prepare"].append(t3 - t2)
+
+        entry_tracker.process(frame, rgb, refresh)
+        t4 = time.perf_counter()
+        stages["detect" if refresh else "track"].append(t4 - t3)
+        while not telemetry_queue.empty():
+            telemetry_queue.get_nowait()
+        stages["total"].append(time.perf_counter() - t0)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    stream.release()
+
+    return {"frames": frames, "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "stages": {stage: latency(samples) for (stage, samples) in stages.items()}}
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+            "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count()}
+
+
+def run(args, config):
+    results = {"environment": environment(), "benchmarks": {}}
+    benchmarks = results["benchmarks"]
+
+    def record(name, bench, *bench_args):
+        if args.only and not any(name.startswith(only) for only in args.only):
+            return
+        print(f"running {name}...", flush=True)
+        benchmarks[name] = bench(*bench_args)
+        benchmarks[name]["cumulative_peak_rss_mb"] = cumulative_peak_rss_mb()
+
+    record("luma_calculator", lambda: {"calculate": bench_luma(args)})
+    record("centroid_tracker", lambda: {engine: bench_centroid(args, engine)
+                                        for engine in ("greedy", "hungarian", "vectorized")})
+    record("entry_tracker", bench_entry_tracker, args, config)
+    record("telemetry_sender", bench_telemetry_sender, args)
+    if not args.skip_video:
+        record("end_to_end", bench_end_to_end, args, config)
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for (key, value) in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and key != "count":
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    current, previous = flatten(results["benchmarks"]), flatten(baseline["benchmarks"])
+    regressions = 0
+    print(f"{'metric':<52}{'baseline':>12}{'current':>12}{'change':>9}")
+    for (metric, value) in current.items():
+        if metric not in previous or previous[metric] == 0:
+            continue
+        change = (value - previous[metric]) / previous[metric]
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  regression"
+            regressions += 1
+        print(f"{metric:<52}{previous[metric]:>12.3f}{value:>12.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of the counting pipeline and an end-to-end run over a video")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--video", help="cam_addr from the config by default")
+    parser.add_argument("--frames", type=int, default=1000,
+                        help="maximum number of video frames for the end-to-end run")
+    parser.add_argument("--luma-every", type=int, default=100,
+                        help="frames between luma samples in the end-to-end run")
+    parser.add_argument("--skip-video", action="store_true")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--people", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--only", nargs="+", help="run only the benchmarks with these name prefixes")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as cfg:
+        config = json.load(cfg)
+    args.video = args.video or config['cam_addr']
+
+    cv2.setRNGSeed(SEED)
+    results = run(args, config)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=4)
+    print("results written to", args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        raise SystemExit(1 if regressions > 0 else 0)
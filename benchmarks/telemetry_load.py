@@ -0,0 +1,86 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from threading import Thread
+
+import numpy as np
+
+from bounded_queue import BoundedQueue
+from telemetry import EntryTelemetry, LumaTelemetry, TelemetrySender, TelemetryType, TelemetryWrapper
+from telemetry_transport import FileTransport, MockTransport
+
+
+def entry_telemetry():
+    return TelemetryWrapper(TelemetryType.T_ENTRY, EntryTelemetry(datetime.now().isoformat(sep=" "), "UP"))
+
+
+def luma_telemetry():
+    return TelemetryWrapper(TelemetryType.T_LUMA, LumaTelemetry(datetime.now().isoformat(sep=" "), *np.random.random(8)))
+
+
+def produce(queue, make, rate, deadline):
+    produced = 0
+    period = 0 if rate <= 0 else 1 / rate
+    next_at = time.monotonic()
+    while time.monotonic() < deadline:
+        queue.put(make())
+        produced += 1
+        next_at += period
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return produced
+
+
+def run(args):
+    transport = MockTransport(args.publish_delay)
+    if args.transport == "file":
+        transport = FileTransport(os.path.join(tempfile.mkdtemp(), "telemetry.ndjson"))
+    spool = os.path.join(tempfile.mkdtemp(), "spool.db") if args.spool else None
+
+    queue = BoundedQueue(args.queue_size)
+    sender = TelemetrySender(transport, queue, args.batch_size, args.flush_interval, spool)
+
+    counts = {}
+    deadline = time.monotonic() + args.duration
+    producers = [
+        Thread(target=lambda: counts.update(entry=produce(queue, entry_telemetry, args.entry_rate, deadline))),
+        Thread(target=lambda: counts.update(luma=produce(queue, luma_telemetry, args.luma_rate, deadline)))
+    ]
+    start = time.monotonic()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    sender.stop()
+    elapsed = time.monotonic() - start
+
+    produced = counts["entry"] + counts["luma"]
+    print(f"produced: {produced} ({counts['entry']} entry, {counts['luma']} luma)")
+    print(f"sent: {sender.sent}, failed: {sender.failed}")
+    print(f"throughput: {sender.sent / elapsed:.0f} msg/s")
+    if isinstance(transport, MockTransport) and len(transport.latencies) > 0:
+        latencies = np.array(transport.latencies) * 1000
+        print("queue-to-publish latency ms: p50 {:.2f}, p99 {:.2f}, max {:.2f}".format(
+            *np.percentile(latencies, [50, 99]), latencies.max()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Push synthetic telemetry through TelemetrySender without a ThingsBoard server")
+    parser.add_argument("--transport", choices=["mock", "file"], default="mock")
+    parser.add_argument("--entry-rate", type=float, default=100,
+                        help="entry events per second, 0 for as fast as possible")
+    parser.add_argument("--luma-rate", type=float, default=1,
+                        help="luma samples per second, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--publish-delay", type=float, default=0.0,
+                        help="simulated network latency of the mock transport, seconds")
+    parser.add_argument("--spool", action="store_true",
+                        help="route telemetry through an on-disk spool")
+    run(parser.parse_args())
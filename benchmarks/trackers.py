@@ -0,0 +1,59 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import dlib
+import numpy as np
+
+from bounded_queue import BoundedQueue
+from entry_tracker import EntryTracker
+
+
+def synthetic_frames(count, people, width=402, height=226, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, (width - 40, height - 80), size=(people, 2))
+    steps = rng.integers(-2, 3, size=(people, 2))
+    background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        for (x, y) in np.clip(starts + i * steps, 0, (width - 40, height - 80)):
+            cv2.rectangle(frame, (int(x), int(y)), (int(x) + 40, int(y) + 80), (40, 40, 200), -1)
+        frames.append(frame)
+    return frames, starts
+
+
+def frame_time(frames, starts, workers):
+    pool = ThreadPoolExecutor(workers) if workers > 1 else None
+    height, width = frames[0].shape[:2]
+    entry_tracker = EntryTracker(width, height, BoundedQueue(), None, tracker_pool=pool)
+
+    for (x, y) in starts:
+        tracker = dlib.correlation_tracker()
+        tracker.start_track(frames[0], dlib.rectangle(int(x), int(y), int(x) + 40, int(y) + 80))
+        entry_tracker.trackers.append(tracker)
+
+    start = time.perf_counter()
+    for frame in frames[1:]:
+        entry_tracker.process(frame, frame, False)
+    elapsed = time.perf_counter() - start
+
+    if pool is not None:
+        pool.shutdown()
+    return elapsed / (len(frames) - 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Frame time of EntryTracker.process against the number of tracked people")
+    parser.add_argument("--people", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    print("people " + "".join(f"{w:>8}w" for w in args.workers) + "   (ms per frame)")
+    for people in args.people:
+        frames, starts = synthetic_frames(args.frames, people)
+        times = [frame_time(frames, starts, workers) * 1000 for workers in args.workers]
+        print(f"{people:>6} " + "".join(f"{t:>9.2f}" for t in times))
@@ -0,0 +1,57 @@
+import enum
+from queue import Queue
+
+# put by producers on shutdown, consumers drain everything before it and exit
+STOP = object()
+
+
+class DropPolicy(enum.Enum):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+
+
+class BoundedQueue(Queue):
+    def __init__(self, maxsize=0, policy=DropPolicy.BLOCK) -> None:
+        super().__init__(maxsize)
+        self.policy = DropPolicy(policy)
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == DropPolicy.BLOCK or item is STOP:
+            return super().put(item, block, timeout)
+
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self.dropped += 1
+                if self.policy == DropPolicy.DROP_NEWEST:
+                    return
+                self._get()
+                self.unfinished_tasks -= 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_many(self, items):
+        with self.not_full:
+            for item in items:
+                if 0 < self.maxsize <= self._qsize():
+                    if self.policy == DropPolicy.BLOCK or item is STOP:
+                        self.not_full.wait_for(
+                            lambda: self._qsize() < self.maxsize)
+                    else:
+                        self.dropped += 1
+                        if self.policy == DropPolicy.DROP_NEWEST:
+                            continue
+                        self._get()
+                        self.unfinished_tasks -= 1
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+
+    def depth(self) -> int:
+        return self.qsize()
+
+    @staticmethod
+    def from_config(config, name, maxsize, policy) -> "BoundedQueue":
+        return BoundedQueue(config.get(f'{name}_queue_size', maxsize), config.get(f'{name}_queue_policy', policy))
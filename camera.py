@@ -0,0 +1,47 @@
+import numpy as np
+
+from detection_scheduler import make_scheduler
+from frame_capture import FrameCapture
+from idle_gate import IdleGate
+from metrics import NULL_METRICS
+
+
+class Camera:
+    def __init__(self, name, cam_addr, entry_at, capture_mode="auto", capture_buffer=4, config=None, metrics=NULL_METRICS) -> None:
+        self.name = name
+        self.metrics = metrics.with_labels(camera=name)
+        # camera specific settings, such as counting lines, fall back to the global config
+        self.config = config or {}
+        self.cam_addr = cam_addr
+        self.entry_at = entry_at
+        self.capture = FrameCapture(
+            cam_addr, 402, capture_mode, capture_buffer, self.metrics).start()
+        self.metrics.gauge("capture_dropped", lambda: self.capture.dropped)
+        self.metrics.gauge("capture_lagged", lambda: self.capture.lagged)
+        self.entry_tracker = None
+        self.scheduler = make_scheduler(self.config, self.metrics)
+        self.idle_gate = None
+        if self.config.get('idle_gate') is not None:
+            self.idle_gate = IdleGate(**self.config['idle_gate'], metrics=self.metrics)
+        self.total_frames = 0
+
+    def wait_ready(self, timeout=None):
+        frame_shape = self.capture.wait_ready(timeout)
+        if frame_shape is None and not self.capture.finished:
+            raise RuntimeError(f"No frame from {self.cam_addr} after {timeout} s")
+        if frame_shape is None:
+            raise RuntimeError(f"Cannot read video from {self.cam_addr}")
+        self.frame_height, self.frame_width = frame_shape[:2]
+        # RGB copy of the current frame for dlib, converted into the same buffer every frame
+        self.rgb = np.empty(frame_shape, dtype=np.uint8)
+
+    def stop(self):
+        self.capture.stop()
+
+    @staticmethod
+    def from_config(config, metrics=NULL_METRICS):
+        cameras = config.get('cameras') or [
+            {"cam_addr": config['cam_addr'], "entry_at": config['entry_at']}]
+        return [Camera(camera.get('name', f"camera {i}"), camera['cam_addr'], camera['entry_at'],
+                       config.get('capture_mode', "auto"), config.get('capture_buffer', 4), {**config, **camera}, metrics)
+                for (i, camera) in enumerate(cameras)]
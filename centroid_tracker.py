@@ -1,39 +1,44 @@
 from collections import OrderedDict
 
-from scipy.spatial import distance as dist
 import numpy as np
 
 
+def distances(a, b):
+    # euclidean distance of every pair, what scipy's cdist returns for 2-D points
+    deltas = np.asarray(a, dtype="float")[:, None, :] - np.asarray(b, dtype="float")[None, :, :]
+    return np.sqrt((deltas * deltas).sum(axis=2))
+
+
 class CentroidTracker:
-    def __init__(self, disappeared_remove_delay=30, max_centroid_dist=50):
+    def __init__(self, disappeared_remove_delay=30, max_centroid_dist=50, on_deregister=None):
         self.next_object_id = 0
         self.objects = OrderedDict()
         self.disappeared = OrderedDict()
 
         self.disappeared_remove_delay = disappeared_remove_delay
         self.max_centroid_dist = max_centroid_dist
+        self.on_deregister = on_deregister
+        # reused for the centroids of every update, objects keep their own copies
+        self.sums = np.zeros((0, 2))
+        self.input_centroids = np.zeros((0, 2), dtype="int")
 
     def register(self, centroid):
-        self.objects[self.next_object_id] = centroid
+        self.objects[self.next_object_id] = centroid.copy()
         self.disappeared[self.next_object_id] = 0
         self.next_object_id += 1
 
     def deregister(self, objectID):
         del self.objects[objectID]
         del self.disappeared[objectID]
+        if self.on_deregister is not None:
+            self.on_deregister(objectID)
 
     def update(self, rects):
         if len(rects) == 0:
             self.__update_disappeared()
             return self.objects
 
-        input_centroids = np.zeros((len(rects), 2), dtype="int")
-
-        for (i, (startX, startY, endX, endY)) in enumerate(rects):
-            cX = int((startX + endX) / 2.0)
-            cY = int((startY + endY) / 2.0)
-            input_centroids[i] = (cX, cY)
-
+        input_centroids = self.__centroids(np.asarray(rects))
         if len(self.objects) == 0:
             self.__register_centroids(input_centroids)
         else:
@@ -41,6 +46,20 @@ class CentroidTracker:
 
         return self.objects
 
+    def __centroids(self, rects):
+        count = len(rects)
+        if len(self.sums) < count:
+            self.sums = np.zeros((max(count, 2 * len(self.sums)), 2))
+            self.input_centroids = np.zeros((len(self.sums), 2), dtype="int")
+
+        sums = self.sums[:count]
+        np.add(rects[:, :2], rects[:, 2:], out=sums)
+        np.multiply(sums, 0.5, out=sums)
+        # int() truncates toward zero, so does the float to int assignment
+        input_centroids = self.input_centroids[:count]
+        input_centroids[...] = sums
+        return input_centroids
+
     def __update_disappeared(self):
         for objectID in list(self.disappeared.keys()):
             self.disappeared[objectID] += 1
@@ -50,7 +69,7 @@ class CentroidTracker:
     def __update_objects(self, input_centroids):
         objects_ids = list(self.objects.keys())
         objects_centroids = list(self.objects.values())
-        centroids_pairwise_dists = dist.cdist(
+        centroids_pairwise_dists = distances(
             np.array(objects_centroids), input_centroids)
 
         rows = centroids_pairwise_dists.min(axis=1).argsort()
@@ -66,7 +85,7 @@ class CentroidTracker:
                 continue
 
             object_id = objects_ids[row]
-            self.objects[object_id] = input_centroids[col]
+            self.objects[object_id][:] = input_centroids[col]
             self.disappeared[object_id] = 0
 
             used_rows.add(row)
@@ -77,17 +96,114 @@ class CentroidTracker:
         unused_cols = set(
             range(0, centroids_pairwise_dists.shape[1])).difference(used_cols)
 
+        # in index order, set order would hand out ids in hash order
         if centroids_pairwise_dists.shape[0] >= centroids_pairwise_dists.shape[1]:
-            for row in unused_rows:
+            for row in sorted(unused_rows):
                 object_id = objects_ids[row]
                 self.disappeared[object_id] += 1
 
                 if self.disappeared[object_id] > self.disappeared_remove_delay:
                     self.deregister(object_id)
         else:
-            for col in unused_cols:
+            for col in sorted(unused_cols):
                 self.register(input_centroids[col])
 
     def __register_centroids(self, input_centroids):
         for i in range(0, len(input_centroids)):
             self.register(input_centroids[i])
+
+
+class ArrayCentroidTracker:
+    MATCHERS = ("hungarian", "vectorized")
+
+    def __init__(self, disappeared_remove_delay=30, max_centroid_dist=50, on_deregister=None, matcher="hungarian"):
+        if matcher not in self.MATCHERS:
+            raise ValueError(f"Unknown centroid matcher: {matcher}")
+
+        self.next_object_id = 0
+        self.ids = np.zeros(0, dtype="int")
+        self.centroids = np.zeros((0, 2), dtype="int")
+        self.disappeared = np.zeros(0, dtype="int")
+        self.objects = OrderedDict()
+
+        self.disappeared_remove_delay = disappeared_remove_delay
+        self.max_centroid_dist = max_centroid_dist
+        self.on_deregister = on_deregister
+        self.matcher = matcher
+        if matcher == "hungarian":
+            # scipy takes most of a second to import, only this matcher needs it
+            from scipy.optimize import linear_sum_assignment
+            self.linear_sum_assignment = linear_sum_assignment
+
+    def update(self, rects):
+        rects = np.asarray(rects, dtype="float").reshape(-1, 4)
+        input_centroids = ((rects[:, :2] + rects[:, 2:]) / 2.0).astype("int")
+
+        if len(input_centroids) == 0:
+            self.__age(np.ones(len(self.ids), dtype=bool))
+        elif len(self.ids) == 0:
+            self.__register(input_centroids)
+        else:
+            self.__update_objects(input_centroids)
+
+        self.objects = OrderedDict(zip(self.ids.tolist(), self.centroids.copy()))
+        return self.objects
+
+    def __update_objects(self, input_centroids):
+        dists = distances(self.centroids, input_centroids)
+        rows, cols = self.__match(dists)
+        keep = dists[rows, cols] <= self.max_centroid_dist
+        rows, cols = rows[keep], cols[keep]
+
+        self.centroids[rows] = input_centroids[cols]
+        self.disappeared[rows] = 0
+
+        if dists.shape[0] >= dists.shape[1]:
+            unused_rows = np.ones(dists.shape[0], dtype=bool)
+            unused_rows[rows] = False
+            self.__age(unused_rows)
+        else:
+            unused_cols = np.ones(dists.shape[1], dtype=bool)
+            unused_cols[cols] = False
+            self.__register(input_centroids[unused_cols])
+
+    def __match(self, dists):
+        if self.matcher == "hungarian":
+            # gated entries can never beat a real match, they are filtered out afterwards
+            gated = np.where(dists > self.max_centroid_dist,
+                             self.max_centroid_dist * dists.size + 1, dists)
+            return self.linear_sum_assignment(gated)
+
+        # same greedy order as CentroidTracker: closest rows first, each column taken once
+        rows = dists.min(axis=1).argsort()
+        cols = dists.argmin(axis=1)[rows]
+        _, first = np.unique(cols, return_index=True)
+        return rows[first], cols[first]
+
+    def __age(self, mask):
+        self.disappeared[mask] += 1
+        removed = self.disappeared > self.disappeared_remove_delay
+        if not removed.any():
+            return
+
+        if self.on_deregister is not None:
+            for object_id in self.ids[removed].tolist():
+                self.on_deregister(object_id)
+        self.ids = self.ids[~removed]
+        self.centroids = self.centroids[~removed]
+        self.disappeared = self.disappeared[~removed]
+
+    def __register(self, input_centroids):
+        count = len(input_centroids)
+        self.ids = np.concatenate(
+            [self.ids, np.arange(self.next_object_id, self.next_object_id + count)])
+        self.centroids = np.concatenate([self.centroids, input_centroids])
+        self.disappeared = np.concatenate(
+            [self.disappeared, np.zeros(count, dtype="int")])
+        self.next_object_id += count
+
+
+def make_centroid_tracker(engine="greedy", disappeared_remove_delay=30, max_centroid_dist=50, on_deregister=None):
+    if engine == "greedy":
+        return CentroidTracker(disappeared_remove_delay, max_centroid_dist, on_deregister)
+    return ArrayCentroidTracker(disappeared_remove_delay, max_centroid_dist, on_deregister, engine)
@@ -0,0 +1,83 @@
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from metrics import NULL_METRICS
+
+
+class MotionDetector:
+    def __init__(self, size=(64, 36)) -> None:
+        self.size = size
+        self.previous = None
+
+    def update(self, frame) -> float:
+        thumbnail = cv2.cvtColor(cv2.resize(
+            frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        previous, self.previous = self.previous, thumbnail
+        if previous is None:
+            return 0.0
+        return float(cv2.absdiff(thumbnail, previous).mean()) / 255
+
+
+class FixedScheduler:
+    def __init__(self, skip_frames, metrics=NULL_METRICS) -> None:
+        self.skip_frames = skip_frames
+        self.frames = 0
+        self.decisions = Counter()
+        self.metrics = metrics
+
+    def should_refresh(self, frame, entry_tracker) -> bool:
+        refresh = self.frames % self.skip_frames == 0
+        self.frames += 1
+        reason = "fixed" if refresh else "skip"
+        self.decisions[reason] += 1
+        self.metrics.inc("detection_decisions_total", reason=reason)
+        return refresh
+
+
+class AdaptiveScheduler:
+    def __init__(self, min_interval=5, max_interval=150, motion_threshold=0.01, psr_threshold=7.0, line_margin=40, metrics=NULL_METRICS) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold
+        self.psr_threshold = psr_threshold
+        self.line_margin = line_margin
+
+        self.motion = MotionDetector()
+        self.since_refresh = max_interval
+        self.decisions = Counter()
+        self.metrics = metrics
+        self.last_motion = 0.0
+
+    def should_refresh(self, frame, entry_tracker) -> bool:
+        self.last_motion = self.motion.update(frame)
+        reason = self.__decide(entry_tracker)
+        self.decisions[reason] += 1
+        self.metrics.inc("detection_decisions_total", reason=reason)
+
+        if reason == "skip":
+            self.since_refresh += 1
+            return False
+        self.since_refresh = 1
+        return True
+
+    def __decide(self, entry_tracker):
+        if self.since_refresh >= self.max_interval:
+            return "max interval"
+        if self.since_refresh < self.min_interval:
+            return "skip"
+
+        if len(entry_tracker.trackers) == 0:
+            return "motion" if self.last_motion > self.motion_threshold else "skip"
+        if len(entry_tracker.confidences) > 0 and np.min(entry_tracker.confidences) < self.psr_threshold:
+            return "low confidence"
+        if entry_tracker.near_line(self.line_margin):
+            return "near line"
+        return "skip"
+
+
+def make_scheduler(config, metrics=NULL_METRICS):
+    if config.get('detection_schedule', "fixed") == "adaptive":
+        return AdaptiveScheduler(**config.get('adaptive_detection', {}), metrics=metrics)
+    return FixedScheduler(config.get('skip_frames', 31), metrics)
@@ -0,0 +1,195 @@
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+from person_detector import BACKENDS, TARGETS, PersonDetector, iou
+
+# keys of config.json that select how the network runs, calibration overrides them
+DETECTOR_OPTIONS = ("net_input_size", "net_backend", "net_target", "net_precision")
+PRECISIONS = ("fp32", "fp16", "int8")
+INPUT_SIZES = [[300, 300], [256, 256], [224, 224]]
+MATCH_IOU = 0.5
+CALIBRATION_CACHE = "detector_calibration.json"
+
+
+def sample_frames(src, count, width=402):
+    stream = cv2.VideoCapture(src)
+    if not stream.isOpened():
+        raise RuntimeError(f"Cannot read video from {src}")
+
+    frame_count = int(stream.get(cv2.CAP_PROP_FRAME_COUNT))
+    positions = np.linspace(0, frame_count - 1, count).astype(int) if frame_count > count else None
+    frames = []
+    for i in range(count if positions is None else len(positions)):
+        if positions is not None:
+            stream.set(cv2.CAP_PROP_POS_FRAMES, int(positions[i]))
+        grabbed, frame = stream.read()
+        if not grabbed:
+            break
+        (h, w) = frame.shape[:2]
+        frames.append(cv2.resize(frame, (width, int(h * width / float(w))), interpolation=cv2.INTER_AREA))
+    stream.release()
+
+    if len(frames) == 0:
+        raise RuntimeError(f"Cannot read video from {src}")
+    return frames
+
+
+def candidates(input_sizes):
+    targets = []
+    for (backend, backend_id) in BACKENDS.items():
+        available = set(cv2.dnn.getAvailableTargets(backend_id))
+        targets.extend((backend, target) for (target, target_id) in TARGETS.items() if target_id in available)
+
+    for input_size in input_sizes:
+        for (backend, target) in targets:
+            yield {"net_input_size": input_size, "net_backend": backend, "net_target": target, "net_precision": "fp32"}
+            # quantized networks only run on OpenCV's own CPU implementation
+            if backend in ("default", "opencv") and target == "cpu" and hasattr(cv2.dnn.Net, "quantize"):
+                yield {"net_input_size": input_size, "net_backend": backend, "net_target": target, "net_precision": "int8"}
+
+
+def precision_target(precision, target):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown network precision: {precision}")
+    if precision != "fp16" or target.endswith("_fp16"):
+        return target
+    # half precision is a property of the OpenCV target, e.g. cpu_fp16 or cuda_fp16
+    if f"{target}_fp16" not in TARGETS:
+        raise ValueError(f"DNN target {target} has no FP16 variant in this OpenCV build")
+    return f"{target}_fp16"
+
+
+def build_detector(options, confidence, frame_width, frame_height, frames=None):
+    precision = options.get('net_precision', "fp32")
+    target = precision_target(precision, options.get('net_target', "cpu"))
+    detector = PersonDetector(frame_width, frame_height, confidence,
+                              options.get('net_input_size', PersonDetector.INPUT_SIZE),
+                              options.get('net_backend', "default"), target)
+    if precision == "int8":
+        detector.quantize(frames)
+    return detector
+
+
+def accuracy(boxes, reference):
+    # F1 score of the person boxes against the reference configuration
+    matched = found = expected = 0
+    for (frame_boxes, frame_reference) in zip(boxes, reference):
+        found += len(frame_boxes)
+        expected += len(frame_reference)
+        if len(frame_boxes) == 0 or len(frame_reference) == 0:
+            continue
+        overlaps = iou(frame_boxes, frame_reference)
+
+        used = set()
+        for i in range(len(frame_boxes)):
+            for j in np.argsort(-overlaps[i]):
+                if overlaps[i, j] < MATCH_IOU:
+                    break
+                if j not in used:
+                    used.add(j)
+                    matched += 1
+                    break
+    if found + expected == 0:
+        return 1.0
+    return 2 * matched / (found + expected)
+
+
+def measure(detector, frames, repeat):
+    boxes = [detector.detect(frame) for frame in frames]
+    latencies = []
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            detector.detect(frame)
+            latencies.append(time.perf_counter() - start)
+    return boxes, float(np.median(latencies)) * 1000
+
+
+def calibration_frames(config):
+    calibration = config.get('net_calibration') or {}
+    return sample_frames(calibration.get('video', config['cam_addr']), calibration.get('frames', 30))
+
+
+def calibrate(config, frames):
+    calibration = config['net_calibration']
+    min_accuracy = calibration.get('min_accuracy', 0.9)
+    repeat = calibration.get('repeat', 3)
+    (height, width) = frames[0].shape[:2]
+
+    def build(options):
+        return build_detector(options, config['net_confidence'], width, height, frames)
+
+    # full precision at the trained input size on the default backend
+    reference = [build({}).detect(frame) for frame in frames]
+    results = []
+    for options in candidates(calibration.get('input_sizes', INPUT_SIZES)):
+        try:
+            boxes, latency = measure(build(options), frames, repeat)
+        except cv2.error:
+            # listed by OpenCV but not usable on this host, e.g. no OpenCL device
+            continue
+        results.append((latency, accuracy(boxes, reference), options))
+
+    print("Detector calibration (latency ms, accuracy, options):")
+    for (latency, score, options) in sorted(results, key=lambda result: result[0]):
+        print(f"{latency:8.2f} {score:6.3f}  {options}")
+
+    accepted = [result for result in results if result[1] >= min_accuracy]
+    if len(accepted) == 0:
+        raise RuntimeError(f"No detector options reach accuracy {min_accuracy}")
+    (latency, score, options) = min(accepted, key=lambda result: result[0])
+    print("Detector options chosen:", options)
+    return options
+
+
+def calibration_key(config):
+    # a result only holds for the same OpenCV build, host, video and calibration settings
+    calibration = {key: value for (key, value) in config['net_calibration'].items() if key != 'cache'}
+    key = {"opencv": cv2.__version__, "machine": platform.machine(), "processor": platform.processor(),
+           "cpus": os.cpu_count(), "net_confidence": config['net_confidence'],
+           "video": calibration.get('video', config['cam_addr']), "calibration": calibration}
+    return json.loads(json.dumps(key))
+
+
+def cached_options(path, key):
+    if path is None or not os.path.isfile(path):
+        return None
+    with open(path, "r") as cache:
+        cached = json.load(cache)
+    return cached['options'] if cached.get('key') == key else None
+
+
+def detector_options(config):
+    if config.get('net_calibration') is None:
+        return {key: config[key] for key in DETECTOR_OPTIONS if key in config}
+
+    # calibration runs every candidate network, so its result is kept across restarts
+    path = config['net_calibration'].get('cache', CALIBRATION_CACHE)
+    key = calibration_key(config)
+    options = cached_options(path, key)
+    if options is not None:
+        print("Detector options from", path, options)
+        return options
+
+    options = calibrate(config, calibration_frames(config))
+    if path is not None:
+        with open(path, "w") as cache:
+            json.dump({"key": key, "options": options}, cache, indent=4)
+    return options
+
+
+def make_detector(config, frame_width, frame_height, options=None):
+    if config.get('net_threads', 0) > 0:
+        cv2.setNumThreads(config['net_threads'])
+
+    if options is None:
+        options = detector_options(config)
+    frames = None
+    if options.get('net_precision', "fp32") == "int8":
+        frames = calibration_frames(config)
+    return build_detector(options, config['net_confidence'], frame_width, frame_height, frames)
@@ -1,116 +1,168 @@
+from concurrent.futures import Executor
 from datetime import datetime
 
-import cv2
 import dlib
 import numpy as np
 
-from centroid_tracker import CentroidTracker
-from trackable_object import TrackableObject
+from centroid_tracker import make_centroid_tracker
+from person_detector import DetectorClient, PersonDetector, iou
+from line_counter import LineCounter
+from metrics import NULL_METRICS
 from telemetry import EntryTelemetry, TelemetryWrapper, TelemetryType
 
-NET_CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat",
-               "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
-               "dog", "horse", "motorbike", "person", "pottedplant", "sheep",
-               "sofa", "train", "tvmonitor"]
-
 
 class EntryTracker:
-    def __init__(self, frame_width, frame_height, confidence, telemetry_queue) -> None:
-        self.centroid_tracker = CentroidTracker(40, 50)
+    # overlap needed for a fresh detection to keep an existing tracker instead of restarting it
+    MATCH_IOU = 0.3
+
+    def __init__(self, frame_width, frame_height, telemetry_queue, detector: PersonDetector, async_detector: DetectorClient = None, device=None, tracker_pool: Executor = None, line_counter: LineCounter = None, centroid_engine="greedy", clock=datetime.now, detection_crop=None, metrics=NULL_METRICS) -> None:
+        self.line_counter = line_counter or LineCounter(frame_width, frame_height)
+        self.centroid_tracker = make_centroid_tracker(
+            centroid_engine, 40, 50, self.line_counter.evict)
         self.trackers = []
-        self.trackable_objects = {}
+        # peak-to-side-lobe ratios from the last tracker update
+        self.confidences = []
+        # tracker positions, grown as needed and overwritten by every update
+        self.rects = np.zeros((0, 4), dtype="int")
 
-        self.net = cv2.dnn.readNetFromCaffe(
-            "mobilenet_ssd/MobileNetSSD_deploy.prototxt", "mobilenet_ssd/MobileNetSSD_deploy.caffemodel")
+        self.detector = detector
+        self.async_detector = async_detector
 
         self.frame_width = frame_width
         self.frame_height = frame_height
-        self.confidence_limit = confidence
         self.telemetry_queue = telemetry_queue
+        self.device = device
+        self.tracker_pool = tracker_pool
+        self.clock = clock
+        # (x0, y0, x1, y1) of the part of the frame the detector sees, trackers still follow the full frame
+        self.detection_crop = detection_crop
+        self.metrics = metrics
+        metrics.gauge("trackers", lambda: len(self.trackers))
+        metrics.gauge("objects", lambda: len(self.centroid_tracker.objects))
+
+    def __start_tracker(self, rgb, box):
+        (x0, y0, x1, y1) = box
+        corr_tracker = dlib.correlation_tracker()
+        rect = dlib.rectangle(x0, y0, x1, y1)
+        corr_tracker.start_track(rgb, rect)
+        return corr_tracker
 
     def __refresh_trackers(self, frame, rgb):
-        self.trackers = []
-
-        blob = cv2.dnn.blobFromImage(
-            frame, 0.007843, (self.frame_width, self.frame_height), 127.5)
-        self.net.setInput(blob)
-
-        detections = self.net.forward()
-
-        for i in np.arange(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-
-            if confidence > self.confidence_limit:
-                class_id = int(detections[0, 0, i, 1])
-                if NET_CLASSES[class_id] != "person":
-                    continue
-
-                box = detections[0, 0, i, 3:7] * np.array(
-                    [self.frame_width, self.frame_height, self.frame_width, self.frame_height])
-                (x0, y0, x1, y1) = box.astype("int")
-
-                corr_tracker = dlib.correlation_tracker()
-                rect = dlib.rectangle(x0, y0, x1, y1)
-                corr_tracker.start_track(rgb, rect)
-
-                self.trackers.append(corr_tracker)
+        with self.metrics.time("detect"):
+            boxes = self.__to_frame(self.detector.detect(self.__crop(frame)))
+        with self.metrics.time("track_start"):
+            self.trackers = [self.__start_tracker(rgb, box) for box in boxes]
+        self.confidences = []
+        return boxes
+
+    def __crop(self, frame):
+        if self.detection_crop is None:
+            return frame
+        (x0, y0, x1, y1) = self.detection_crop
+        return frame[y0:y1, x0:x1]
+
+    def __to_frame(self, boxes):
+        if self.detection_crop is None or len(boxes) == 0:
+            return boxes
+        (x0, y0, _, _) = self.detection_crop
+        return [tuple(box) for box in np.array(boxes) + (x0, y0, x0, y0)]
+
+    def __reconcile_trackers(self, boxes, rgb, rects):
+        if len(boxes) == 0:
+            self.trackers = []
+            self.confidences = []
+            return []
+
+        matched = np.full(len(boxes), -1)
+        if len(rects) > 0:
+            overlaps = iou(boxes, rects)
+            for (i, j) in zip(*np.unravel_index(np.argsort(-overlaps, axis=None), overlaps.shape)):
+                if overlaps[i, j] < self.MATCH_IOU:
+                    break
+                if matched[i] < 0 and j not in matched:
+                    matched[i] = j
+
+        trackers = []
+        reconciled = []
+        for (i, box) in enumerate(boxes):
+            if matched[i] >= 0:
+                trackers.append(self.trackers[matched[i]])
+                reconciled.append(rects[matched[i]])
+            else:
+                trackers.append(self.__start_tracker(rgb, box))
+                reconciled.append(box)
+        self.trackers = trackers
+        return reconciled
+
+    @staticmethod
+    def __update_tracker(tracker, rgb, rect):
+        confidence = tracker.update(rgb)
+        pos = tracker.get_position()
+        # truncated like int() when stored
+        rect[:] = (pos.left(), pos.top(), pos.right(), pos.bottom())
+        return confidence
 
     def __update_trackers(self, rgb):
-        rects = []
-        for tracker in self.trackers:
-            tracker.update(rgb)
-            pos = tracker.get_position()
-
-            x0 = int(pos.left())
-            y0 = int(pos.top())
-            x1 = int(pos.right())
-            y1 = int(pos.bottom())
-
-            rects.append((x0, y0, x1, y1))
+        count = len(self.trackers)
+        if len(self.rects) < count:
+            self.rects = np.zeros((max(count, 2 * len(self.rects)), 4), dtype="int")
+        rects = self.rects[:count]
+
+        if self.tracker_pool is None or count < 2:
+            self.confidences = [EntryTracker.__update_tracker(tracker, rgb, rect)
+                                for (tracker, rect) in zip(self.trackers, rects)]
+        else:
+            # dlib releases the GIL while correlating, every task writes its own row
+            self.confidences = list(self.tracker_pool.map(
+                EntryTracker.__update_tracker, self.trackers, [rgb] * count, rects))
         return rects
 
-    def __put_telemetry(self, direction):
-        telemetry = EntryTelemetry(
-            datetime.now().isoformat(sep=" "), direction)
-        self.telemetry_queue.put(TelemetryWrapper(
-            TelemetryType.T_ENTRY, telemetry))
+    def __put_telemetry(self, events):
+        timestamp = self.clock().isoformat(sep=" ")
+        self.telemetry_queue.put_many([TelemetryWrapper(
+            TelemetryType.T_ENTRY, EntryTelemetry(timestamp, direction, line), device=self.device) for (line, direction) in events])
 
     def __register_entries(self, objects):
-        coords = []
-        for (object_id, centroid) in objects.items():
-            obj = self.trackable_objects.get(object_id, None)
-            
-            coords.append((centroid[0], centroid[1]))
-
-            if obj is None:
-                obj = TrackableObject(object_id, centroid)
-                self.trackable_objects[object_id] = obj
-                continue
-
-            mov_dir = centroid[1] - np.mean([c[1] for c in obj.centroids])
-            obj.centroids.append(centroid)
-
-            if not obj.counted:
-                if mov_dir < 0 and centroid[1] < self.frame_height // 2:
-                    self.__put_telemetry("UP")
-                    print("UP")
-                    obj.counted = True
-
-                elif mov_dir > 0 and centroid[1] > self.frame_height // 2:
-                    self.__put_telemetry("DOWN")
-                    print("DOWN")
-                    obj.counted = True
-
-            self.trackable_objects[object_id] = obj
-        return coords
+        with self.metrics.time("count"):
+            events = self.line_counter.update(objects)
+        if len(events) > 0:
+            self.metrics.inc("entries_total", len(events))
+            self.__put_telemetry(events)
+        return [(centroid[0], centroid[1]) for centroid in objects.values()]
 
     def process(self, frame, rgb, refresh_trackers):
-        rects = []
-        if refresh_trackers:
-            self.__refresh_trackers(frame, rgb)
+        if self.async_detector is None:
+            if refresh_trackers:
+                rects = self.__refresh_trackers(frame, rgb)
+            else:
+                with self.metrics.time("track"):
+                    rects = self.__update_trackers(rgb)
         else:
-            rects = self.__update_trackers(rgb)
-
-        objects = self.centroid_tracker.update(rects)
+            if refresh_trackers and not self.async_detector.busy():
+                self.async_detector.submit(self.__crop(frame))
+            with self.metrics.time("track"):
+                rects = self.__update_trackers(rgb)
+            boxes = self.async_detector.poll()
+            if boxes is not None:
+                with self.metrics.time("reconcile"):
+                    rects = self.__reconcile_trackers(self.__to_frame(boxes), rgb, rects)
+
+        with self.metrics.time("centroid"):
+            objects = self.centroid_tracker.update(rects)
 
         return self.__register_entries(objects)
+
+    @staticmethod
+    def crop_from_config(config, line_counter: LineCounter):
+        crop = config.get('detection_crop')
+        if crop is None:
+            return None
+        if crop.get('rect') is not None:
+            return tuple(crop['rect'])
+        return line_counter.band(crop.get('margin', 60))
+
+    def near_line(self, margin) -> bool:
+        objects = self.centroid_tracker.objects
+        if len(objects) == 0:
+            return False
+        return self.line_counter.near(np.array(list(objects.values())), margin)
@@ -0,0 +1,127 @@
+import os
+from collections import deque
+from threading import Condition, Thread
+
+import cv2
+import numpy as np
+
+from metrics import NULL_METRICS
+
+
+class FrameCapture:
+    MODES = ("all", "latest")
+
+    def __init__(self, src, width=402, mode="auto", buffer_size=4, metrics=NULL_METRICS) -> None:
+        if mode == "auto":
+            mode = "all" if os.path.isfile(str(src)) else "latest"
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown capture mode: {mode}")
+
+        # opened by the capture thread, so that cameras connect in parallel and in the background
+        self.src = src
+        self.stream = None
+        self.width = width
+        self.mode = mode
+        self.buffer_size = max(buffer_size, 3)
+        self.metrics = metrics
+
+        self.slots = []
+        self.free = deque()
+        self.ready = deque()
+        self.held = None
+        self.frame_shape = None
+        self.stopped = False
+        self.finished = False
+        self.lock = Condition()
+
+        self.captured = 0
+        self.dropped = 0
+        self.lagged = 0
+
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self) -> "FrameCapture":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        self.thread.join()
+        if self.stream is not None:
+            self.stream.release()
+
+    def wait_ready(self, timeout=None):
+        with self.lock:
+            self.lock.wait_for(lambda: self.frame_shape is not None or self.finished, timeout)
+            return self.frame_shape
+
+    def read(self):
+        with self.lock:
+            if self.held is not None:
+                self.free.append(self.held)
+                self.held = None
+                self.lock.notify_all()
+
+            self.lock.wait_for(lambda: len(self.ready) > 0 or self.finished)
+            if len(self.ready) == 0:
+                return None
+            if len(self.ready) > 1:
+                self.lagged += 1
+            if self.mode == "latest":
+                # only the newest frame is live, the older ones go back to the decoder
+                self.held = self.ready.pop()
+                self.dropped += len(self.ready)
+                self.free.extend(self.ready)
+                self.ready.clear()
+                self.lock.notify_all()
+                return self.slots[self.held]
+            self.held = self.ready.popleft()
+            return self.slots[self.held]
+
+    def run(self):
+        self.stream = cv2.VideoCapture(self.src)
+        while not self.stopped:
+            with self.metrics.time("decode"):
+                grabbed, frame = self.stream.read()
+            if not grabbed:
+                break
+            if len(self.slots) == 0:
+                self.__allocate(frame)
+
+            slot = self.__acquire_slot()
+            if slot is None:
+                break
+            with self.metrics.time("resize"):
+                cv2.resize(frame, self.frame_shape[1::-1], dst=self.slots[slot],
+                           interpolation=cv2.INTER_AREA)
+
+            with self.lock:
+                self.ready.append(slot)
+                self.captured += 1
+                self.lock.notify_all()
+
+        with self.lock:
+            self.finished = True
+            self.lock.notify_all()
+
+    def __allocate(self, frame):
+        (h, w) = frame.shape[:2]
+        height = int(h * self.width / float(w))
+        with self.lock:
+            self.slots = [np.empty((height, self.width) + frame.shape[2:], dtype=frame.dtype)
+                          for _ in range(self.buffer_size)]
+            self.free.extend(range(self.buffer_size))
+            self.frame_shape = self.slots[0].shape
+            self.lock.notify_all()
+
+    def __acquire_slot(self):
+        with self.lock:
+            if len(self.free) == 0 and self.mode == "latest" and len(self.ready) > 0:
+                self.dropped += 1
+                return self.ready.popleft()
+            self.lock.wait_for(lambda: len(self.free) > 0 or self.stopped)
+            if self.stopped:
+                return None
+            return self.free.popleft()
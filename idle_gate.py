@@ -0,0 +1,80 @@
+import time
+
+from detection_scheduler import MotionDetector
+from metrics import NULL_METRICS
+
+
+class IdleGate:
+    MODES = ("active", "idle")
+
+    def __init__(self, wake_threshold=0.01, idle_after=150, thumbnail=(32, 18), metrics=NULL_METRICS) -> None:
+        self.wake_threshold = wake_threshold
+        self.idle_after = idle_after
+        self.motion = MotionDetector(thumbnail)
+        self.metrics = metrics
+
+        self.idle = False
+        self.quiet_frames = 0
+        self.woke_at = None
+
+        self.frames = {mode: 0 for mode in self.MODES}
+        self.cpu_time = {mode: 0.0 for mode in self.MODES}
+        self.wake_latencies = []
+        self.mode_started = time.process_time()
+
+    def active(self, frame, entry_tracker) -> bool:
+        self.__account()
+        active = self.__update(frame, entry_tracker)
+        mode = "active" if active else "idle"
+        self.frames[mode] += 1
+        self.metrics.inc("idle_gate_frames_total", mode=mode)
+        return active
+
+    def __update(self, frame, entry_tracker):
+        motion = self.motion.update(frame)
+
+        if self.idle:
+            if motion <= self.wake_threshold:
+                return False
+            self.idle = False
+            self.quiet_frames = 0
+            self.woke_at = time.perf_counter()
+            return True
+
+        busy = len(entry_tracker.trackers) > 0 or len(
+            entry_tracker.centroid_tracker.objects) > 0
+        if busy or motion > self.wake_threshold:
+            self.quiet_frames = 0
+        else:
+            self.quiet_frames += 1
+        if self.quiet_frames >= self.idle_after:
+            self.idle = True
+            return False
+        return True
+
+    def just_woke(self) -> bool:
+        return self.woke_at is not None
+
+    def processed(self):
+        # called once the full path has handled the frame that woke the gate
+        if self.woke_at is not None:
+            self.wake_latencies.append(time.perf_counter() - self.woke_at)
+            self.metrics.observe("wake", self.wake_latencies[-1])
+            self.woke_at = None
+
+    def stats(self):
+        self.__account()
+        return {
+            "frames": dict(self.frames),
+            "cpu ms per frame": {mode: 1000 * self.cpu_time[mode] / max(self.frames[mode], 1) for mode in self.MODES},
+            "wakeups": len(self.wake_latencies),
+            "max wake latency ms": 1000 * max(self.wake_latencies, default=0.0)
+        }
+
+    def __account(self):
+        # cpu time since the previous frame belongs to the mode that frame ran in
+        now = time.process_time()
+        mode = "idle" if self.idle else "active"
+        self.cpu_time[mode] += now - self.mode_started
+        self.metrics.inc("idle_gate_cpu_seconds_total", now - self.mode_started, mode=mode)
+        self.mode_started = now
@@ -0,0 +1,203 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class LineCounter:
+    def __init__(self, frame_width, frame_height, lines=None, zones=None, history_size=0) -> None:
+        if not lines and not zones:
+            lines = [{"name": "entrance", "p0": [0, frame_height // 2],
+                      "p1": [frame_width, frame_height // 2]}]
+        lines = lines or []
+        zones = zones or []
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+
+        self.line_names = np.array([line['name'] for line in lines], dtype=object)
+        self.p0 = np.array([line['p0'] for line in lines], dtype="float").reshape(-1, 2)
+        self.p1 = np.array([line['p1'] for line in lines], dtype="float").reshape(-1, 2)
+        # bounded lines only count centroids that project between p0 and p1
+        self.bounded = np.array([line.get('bounded', False) for line in lines], dtype=bool)
+        direction = self.p1 - self.p0
+        # scaled so the projection of a point is 0 at p0 and 1 at p1
+        self.segment = direction / np.maximum(
+            (direction ** 2).sum(axis=1, keepdims=True), 1)
+        # unit normals point to increasing y for a left-to-right line, so "DOWN" keeps its meaning
+        normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+        self.normal = normal / np.maximum(
+            np.linalg.norm(normal, axis=1, keepdims=True), 1e-9)
+
+        self.zone_names = np.array([zone['name'] for zone in zones], dtype=object)
+        self.polygons = [np.array(zone['polygon'], dtype="float") for zone in zones]
+        self.__setup_zone_edges()
+
+        self.history_size = history_size
+        self.ids = np.zeros(0, dtype="int")
+        self.sums = np.zeros((0, 2))
+        self.counts = np.zeros(0, dtype="int")
+        self.counted = np.zeros((0, len(self.line_names)), dtype=bool)
+        self.inside = np.zeros((0, len(self.zone_names)), dtype=bool)
+        self.history = np.zeros((0, history_size, 2), dtype="int")
+        self.evicted = []
+
+    def __setup_zone_edges(self):
+        edges = max([len(polygon) for polygon in self.polygons], default=0)
+        # polygons are padded with degenerate edges that never cross the ray
+        self.edge_start = np.zeros((len(self.polygons), edges, 2))
+        self.edge_end = np.zeros((len(self.polygons), edges, 2))
+        for (i, polygon) in enumerate(self.polygons):
+            self.edge_start[i, :len(polygon)] = polygon
+            self.edge_end[i, :len(polygon)] = np.roll(polygon, -1, axis=0)
+
+    def evict(self, object_id):
+        self.evicted.append(object_id)
+
+    def update(self, objects) -> List[Tuple[str, str]]:
+        self.__drop_evicted()
+        if len(objects) == 0:
+            return []
+
+        ids = np.fromiter(objects.keys(), dtype="int", count=len(objects))
+        centroids = np.array(list(objects.values()), dtype="int").reshape(-1, 2)
+
+        # self.ids is kept sorted by __register, trackers need not hand out increasing ids
+        rows = np.searchsorted(self.ids, ids)
+        known = rows < len(self.ids)
+        known[known] = self.ids[rows[known]] == ids[known]
+
+        events = self.__line_events(rows[known], centroids[known])
+        events += self.__zone_events(rows[known], centroids[known])
+
+        if self.history_size > 0:
+            self.history[rows[known], self.counts[rows[known]] % self.history_size] = centroids[known]
+        self.sums[rows[known]] += centroids[known]
+        self.counts[rows[known]] += 1
+
+        self.__register(ids[~known], centroids[~known])
+        return events
+
+    def near(self, centroids, margin) -> bool:
+        if len(self.line_names) == 0:
+            return False
+        side = ((centroids[:, None, :] - self.p0[None, :, :])
+                * self.normal[None, :, :]).sum(axis=2)
+        return bool((np.abs(side) < margin).any())
+
+    def band(self, margin) -> Tuple[int, int, int, int]:
+        # rectangle around all lines and zones, unbounded lines are extended to the frame edges
+        points = [self.p0, self.p1] + self.polygons
+        for (p0, p1) in zip(self.p0[~self.bounded], self.p1[~self.bounded]):
+            (dx, dy) = p1 - p0
+            if dx == dy == 0:
+                continue
+            if abs(dx) >= abs(dy):
+                xs = np.array([0, self.frame_width])
+                points.append(np.stack([xs, p0[1] + (xs - p0[0]) * dy / dx], axis=1))
+            else:
+                ys = np.array([0, self.frame_height])
+                points.append(np.stack([p0[0] + (ys - p0[1]) * dx / dy, ys], axis=1))
+        points = np.concatenate(points)
+
+        limit = (self.frame_width, self.frame_height)
+        (x0, y0) = np.clip(points.min(axis=0) - margin, 0, limit)
+        (x1, y1) = np.clip(points.max(axis=0) + margin, 0, limit)
+        return (int(x0), int(y0), int(x1), int(y1))
+
+    def mean_centroids(self) -> np.ndarray:
+        return self.sums / np.maximum(self.counts, 1)[:, None]
+
+    def recent_centroids(self, object_id) -> np.ndarray:
+        # the last trajectory_history centroids of an object, oldest first
+        row = np.searchsorted(self.ids, object_id)
+        if self.history_size == 0 or row == len(self.ids) or self.ids[row] != object_id:
+            return np.zeros((0, 2), dtype="int")
+        count = self.counts[row]
+        if count <= self.history_size:
+            return self.history[row, :count].copy()
+        return np.roll(self.history[row], -(count % self.history_size), axis=0)
+
+    def __line_events(self, rows, centroids):
+        if len(self.line_names) == 0 or len(rows) == 0:
+            return []
+
+        mov_dir = (centroids - self.mean_centroids()[rows]) @ self.normal.T
+        offset = centroids[:, None, :] - self.p0[None, :, :]
+        side = (offset * self.normal[None, :, :]).sum(axis=2)
+        along = (offset * self.segment[None, :, :]).sum(axis=2)
+        open_lines = ~self.counted[rows] & (
+            ~self.bounded | ((along >= 0) & (along <= 1)))
+
+        up = open_lines & (mov_dir < 0) & (side < 0)
+        down = open_lines & (mov_dir > 0) & (side > 0)
+        self.counted[rows] |= up | down
+
+        return [(name, "UP") for name in self.line_names[np.nonzero(up)[1]]] + \
+            [(name, "DOWN") for name in self.line_names[np.nonzero(down)[1]]]
+
+    def __zone_events(self, rows, centroids):
+        if len(self.zone_names) == 0 or len(rows) == 0:
+            return []
+
+        inside = self.__inside(centroids)
+        entered = inside & ~self.inside[rows]
+        left = ~inside & self.inside[rows]
+        self.inside[rows] = inside
+
+        return [(name, "IN") for name in self.zone_names[np.nonzero(entered)[1]]] + \
+            [(name, "OUT") for name in self.zone_names[np.nonzero(left)[1]]]
+
+    def __inside(self, centroids):
+        if len(self.zone_names) == 0:
+            return np.zeros((len(centroids), 0), dtype=bool)
+
+        # even-odd ray casting towards +x, broadcast over points x zones x edges
+        px = centroids[:, 0, None, None]
+        py = centroids[:, 1, None, None]
+        (x0, y0) = (self.edge_start[None, :, :, 0], self.edge_start[None, :, :, 1])
+        (x1, y1) = (self.edge_end[None, :, :, 0], self.edge_end[None, :, :, 1])
+        spans = (y0 > py) != (y1 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross_x = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+        crossings = spans & (px < cross_x)
+        return crossings.sum(axis=2) % 2 == 1
+
+    def __register(self, ids, centroids):
+        if len(ids) == 0:
+            return
+        count = len(ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.sums = np.concatenate([self.sums, centroids])
+        self.counts = np.concatenate([self.counts, np.ones(count, dtype="int")])
+        self.counted = np.concatenate(
+            [self.counted, np.zeros((count, len(self.line_names)), dtype=bool)])
+        self.inside = np.concatenate([self.inside, self.__inside(centroids)])
+        history = np.zeros((count, self.history_size, 2), dtype="int")
+        if self.history_size > 0:
+            history[:, 0] = centroids
+        self.history = np.concatenate([self.history, history])
+
+        if np.any(self.ids[1:] < self.ids[:-1]):
+            # both centroid trackers hand out increasing ids, anything else is sorted here
+            order = np.argsort(self.ids, kind="stable")
+            self.ids = self.ids[order]
+            self.sums = self.sums[order]
+            self.counts = self.counts[order]
+            self.counted = self.counted[order]
+            self.inside = self.inside[order]
+            self.history = self.history[order]
+
+    def __drop_evicted(self):
+        if len(self.evicted) == 0:
+            return
+        keep = ~np.isin(self.ids, self.evicted)
+        self.evicted = []
+        self.ids = self.ids[keep]
+        self.sums = self.sums[keep]
+        self.counts = self.counts[keep]
+        self.counted = self.counted[keep]
+        self.inside = self.inside[keep]
+        self.history = self.history[keep]
+
+    @staticmethod
+    def from_config(config, frame_width, frame_height) -> "LineCounter":
+        return LineCounter(frame_width, frame_height, config.get('counting_lines'), config.get('counting_zones'), config.get('trajectory_history', 0))
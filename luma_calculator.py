@@ -1,6 +1,5 @@
 from datetime import datetime
 from typing import Tuple
-from statistics import geometric_mean
 
 import numpy as np
 
@@ -10,64 +9,82 @@ from telemetry import LumaTelemetry
 class LumaCalculator:
     BLACK_THR, WHITE_THR = 9.0, 95.0
     BLACK_LIM, WHITE_LIM = 0.6, 0.6
+    LUMA_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+    LIGHTNESS_LUT_SIZE = 4096
 
-    def calculate(pic: np.ndarray) -> LumaTelemetry:
-        luma_vector = LumaCalculator.__picture_luma(pic)
-        lightness_vector = [LumaCalculator.__luma_to_perc_lightness(
-            pix) for pix in luma_vector]
+    def calculate(pic: np.ndarray, roi: str = "frame", timestamp: datetime = None) -> LumaTelemetry:
+        luma_vector, lightness_vector = LumaCalculator.picture_lightness(pic)
         filtered_lightness_vector = LumaCalculator.__filter_lightness_vector(
             lightness_vector)
 
-        return LumaTelemetry(*(datetime.now().isoformat(sep=" "), np.mean(luma_vector), geometric_mean(luma_vector)) + LumaCalculator.__calculate_lightness_values(lightness_vector) + LumaCalculator.__calculate_lightness_values(filtered_lightness_vector))
+        timestamp = timestamp or datetime.now()
+        return LumaTelemetry(*(timestamp.isoformat(sep=" "), np.mean(luma_vector), LumaCalculator.__geometric_mean(luma_vector)) + LumaCalculator.__calculate_lightness_values(lightness_vector) + LumaCalculator.__calculate_lightness_values(filtered_lightness_vector), roi=roi)
+
+    @staticmethod
+    def picture_lightness(pic: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        luma_vector = LumaCalculator.__picture_luma(pic)
+        return (luma_vector, LumaCalculator.__luma_to_perc_lightness(luma_vector))
 
     @staticmethod
     def __calculate_lightness_values(lightness_vector: np.ndarray) -> Tuple[float, float, float]:
         mean_perc_lightness: float = np.mean(lightness_vector)
         median_perc_lightness: float = np.median(lightness_vector)
-        geom_mean_perc_lightness: float = geometric_mean(lightness_vector)
+        geom_mean_perc_lightness: float = LumaCalculator.__geometric_mean(
+            lightness_vector)
         return (mean_perc_lightness, median_perc_lightness, geom_mean_perc_lightness)
 
     @staticmethod
-    def __linearize_pixel(pixel: np.ndarray) -> np.ndarray:
-        def transform(channel: float) -> float:
-            if channel < 0.04045:
-                return channel / 12.92
-            return ((channel + 0.055) / 1.055) ** 2.4
+    def __geometric_mean(vector: np.ndarray) -> float:
+        if np.any(vector <= 0):
+            return 0.0
+        return float(np.exp(np.mean(np.log(vector))))
 
-        return np.array([transform(c) for c in pixel])
+    @staticmethod
+    def __linearize_pixel(pixel: np.ndarray) -> np.ndarray:
+        return np.where(pixel < 0.04045, pixel / 12.92, ((pixel + 0.055) / 1.055) ** 2.4)
 
     @staticmethod
-    def __pixel_luma(pixel: np.ndarray) -> float:
-        norm = np.array([1/255, 1/255, 1/255])
-        lin_pixel = LumaCalculator.__linearize_pixel(pixel * norm)
-        multipliers = np.array([0.2126, 0.7152, 0.0722])
-        return np.dot(lin_pixel, multipliers)
+    def __exact_perc_lightness(y: np.ndarray) -> np.ndarray:
+        return np.where(y <= 0.008856, y * 903.3, np.cbrt(y) * 116 - 16)
 
     @staticmethod
-    def __luma_to_perc_lightness(y: float) -> float:
-        return y * 903.3 if y <= 0.008856 else y ** (1 / 3) * 116 - 16
+    def __luma_to_perc_lightness(y: np.ndarray) -> np.ndarray:
+        # piecewise-linear interpolation over a uniform luma grid, max error ~1e-3 L*
+        pos = np.clip(y, 0.0, 1.0) * LumaCalculator.LIGHTNESS_LUT_SIZE
+        idx = np.minimum(pos.astype(np.intp),
+                         LumaCalculator.LIGHTNESS_LUT_SIZE - 1)
+        return LumaCalculator.__LIGHTNESS_LUT[idx] + (pos - idx) * LumaCalculator.__LIGHTNESS_SLOPE[idx]
 
     @staticmethod
     def __picture_luma(pic: np.ndarray) -> np.ndarray:
-        return np.array([[LumaCalculator.__pixel_luma(x) for x in r] for r in pic]).flatten()
+        pixels = pic.reshape(-1, pic.shape[-1])
+        if pixels.dtype != np.uint8:
+            return LumaCalculator.__linearize_pixel(pixels / 255) @ LumaCalculator.LUMA_WEIGHTS
+
+        lut = LumaCalculator.__LUMA_LUT
+        return lut[pixels[:, 0], 0] + lut[pixels[:, 1], 1] + lut[pixels[:, 2], 2]
 
     @staticmethod
     def __bw_lightness_parts(lightness_vector: np.ndarray) -> Tuple[float, float]:
-        l_vec_size = len(lightness_vector)
-        black = len(
-            list(filter(lambda x: x < LumaCalculator.BLACK_THR, lightness_vector))) / l_vec_size
-        white = len(
-            list(filter(lambda x: x > LumaCalculator.WHITE_THR, lightness_vector))) / l_vec_size
+        black = np.count_nonzero(
+            lightness_vector < LumaCalculator.BLACK_THR) / lightness_vector.size
+        white = np.count_nonzero(
+            lightness_vector > LumaCalculator.WHITE_THR) / lightness_vector.size
         return (black, white)
 
     @staticmethod
     def __filter_lightness_vector(lightness_vector: np.ndarray) -> np.ndarray:
         b, w = LumaCalculator.__bw_lightness_parts(lightness_vector)
-        filtered = lightness_vector.copy()
+        keep = np.ones(lightness_vector.shape, dtype=bool)
         if b < LumaCalculator.BLACK_LIM:
-            filtered = np.array(
-                list(filter(lambda x: LumaCalculator.BLACK_THR < x, filtered)))
+            keep &= LumaCalculator.BLACK_THR < lightness_vector
         if w < LumaCalculator.WHITE_LIM:
-            filtered = np.array(
-                list(filter(lambda x: x < LumaCalculator.WHITE_THR, filtered)))
-        return filtered
+            keep &= lightness_vector < LumaCalculator.WHITE_THR
+        return lightness_vector[keep]
+
+    # per-channel linearized and weighted luma for every 8-bit channel value
+    __LUMA_LUT = __linearize_pixel(
+        np.arange(256)[:, None] / 255) * LUMA_WEIGHTS
+    __LIGHTNESS_LUT = __exact_perc_lightness(
+        np.arange(LIGHTNESS_LUT_SIZE + 1) / LIGHTNESS_LUT_SIZE)
+    __LIGHTNESS_SLOPE = np.diff(__LIGHTNESS_LUT)
@@ -1,21 +1,182 @@
-from queue import Queue
-from threading import Thread
+import multiprocessing as mp
+import time
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, Queue
+from threading import Event, Thread
 
+import numpy as np
+
+from bounded_queue import STOP
 from luma_calculator import LumaCalculator
+from luma_histogram import LumaHistogram
+from metrics import NULL_METRICS
 from telemetry import TelemetryType, TelemetryWrapper
 
 
+class LumaProcessor:
+    def __init__(self, window=0, clock=datetime.now) -> None:
+        self.window = window
+        self.clock = clock
+        self.histograms = {}
+        self.window_starts = {}
+
+    def process(self, roi, pixels):
+        now = self.clock()
+        if self.window <= 0:
+            return LumaCalculator.calculate(pixels, roi, now)
+
+        histogram = self.histograms.setdefault(roi, LumaHistogram())
+        if histogram.empty():
+            self.window_starts[roi] = now
+        histogram.add(pixels)
+
+        if (now - self.window_starts[roi]).total_seconds() < self.window:
+            return None
+        telemetry = histogram.telemetry(roi, now)
+        histogram.reset()
+        return telemetry
+
+    def flush(self):
+        # windows still open when the input ends, dropped otherwise
+        now = self.clock()
+        telemetries = [histogram.telemetry(roi, now)
+                       for (roi, histogram) in self.histograms.items() if not histogram.empty()]
+        for histogram in self.histograms.values():
+            histogram.reset()
+        return telemetries
+
+
 class LumaDevice:
-    def __init__(self, frame_queue, telemetry_queue) -> None:
+    def __init__(self, frame_queue, telemetry_queue, window=0, metrics=NULL_METRICS) -> None:
         self.frame_queue: Queue = frame_queue
         self.telemetry_queue: Queue = telemetry_queue
+        self.processor = LumaProcessor(window)
+        self.metrics = metrics
         self.thread = Thread(target=self.run, daemon=True)
         self.thread.start()
 
+    def stop(self):
+        self.frame_queue.put(STOP)
+        self.thread.join()
+
     def run(self):
         while True:
-            if not self.frame_queue.empty():
-                frame = self.frame_queue.get()
-                telemetry = LumaCalculator.calculate(frame)
+            item = self.frame_queue.get()
+            if item is STOP:
+                for telemetry in self.processor.flush():
+                    self.telemetry_queue.put(TelemetryWrapper(
+                        TelemetryType.T_LUMA, telemetry))
+                break
+            # one item holds every region of a sample, so dropping a stale sample drops it whole
+            for (roi, pixels) in item:
+                with self.metrics.time("luma", roi=roi):
+                    telemetry = self.processor.process(roi, pixels)
+                if telemetry is not None:
+                    self.telemetry_queue.put(TelemetryWrapper(
+                        TelemetryType.T_LUMA, telemetry))
+
+
+def luma_worker(slots, tasks, results, window):
+    processor = LumaProcessor(window)
+    while True:
+        task = tasks.get()
+        if task is None:
+            # the open windows are reported rather than lost on shutdown
+            for telemetry in processor.flush():
+                results.put((None, telemetry.roi, telemetry, 0.0))
+            results.put(None)
+            break
+        slot, roi, shape, dtype = task
+        pixels = np.ndarray(shape, dtype, buffer=slots[slot].buf)
+        start = time.perf_counter()
+        telemetry = processor.process(roi, pixels)
+        elapsed = time.perf_counter() - start
+        del pixels
+        results.put((slot, roi, telemetry, elapsed))
+
+
+class LumaProcessDevice:
+    # how often the threads waiting on the worker check that it is still running
+    LIVENESS_INTERVAL = 1.0
+
+    def __init__(self, frame_queue, telemetry_queue, slot_size, window=0, slots=4, metrics=NULL_METRICS) -> None:
+        self.frame_queue: Queue = frame_queue
+        self.telemetry_queue: Queue = telemetry_queue
+        self.metrics = metrics
+        self.failed = Event()
+
+        self.slots = [SharedMemory(create=True, size=slot_size)
+                      for _ in range(slots)]
+        self.free_slots = Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        # capture, detector and telemetry threads are already running, forking them could
+        # leave the child with a lock held by a thread that does not exist there
+        context = mp.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=luma_worker, args=(
+            self.slots, self.tasks, self.results, window), daemon=True)
+        self.process.start()
+
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.collector = Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def stop(self):
+        self.frame_queue.put(STOP)
+        self.thread.join()
+        self.collector.join()
+        self.process.join()
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
+
+    def run(self):
+        while True:
+            item = self.frame_queue.get()
+            if item is STOP:
+                self.tasks.put(None)
+                break
+            for (roi, pixels) in item:
+                slot = self.__free_slot()
+                if slot is None:
+                    break
+                shared = np.ndarray(pixels.shape, pixels.dtype,
+                                    buffer=self.slots[slot].buf)
+                shared[...] = pixels
+                del shared
+                self.tasks.put((slot, roi, pixels.shape, pixels.dtype.str))
+
+    def __free_slot(self):
+        # samples are dropped once the worker is gone, its slots never come back
+        while not self.failed.is_set():
+            try:
+                return self.free_slots.get(timeout=self.LIVENESS_INTERVAL)
+            except Empty:
+                pass
+        return None
+
+    def collect(self):
+        while True:
+            try:
+                result = self.results.get(timeout=self.LIVENESS_INTERVAL)
+            except Empty:
+                if self.process.is_alive():
+                    continue
+                print("Luma worker exited with code", self.process.exitcode)
+                self.failed.set()
+                break
+            if result is None:
+                break
+            slot, roi, telemetry, elapsed = result
+            if slot is not None:
+                self.free_slots.put(slot)
+                # measured in the worker, the collector only records it
+                self.metrics.observe("luma", elapsed, roi=roi)
+            if telemetry is not None:
                 self.telemetry_queue.put(TelemetryWrapper(
                     TelemetryType.T_LUMA, telemetry))
@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+
+from luma_calculator import LumaCalculator
+from telemetry import LumaTelemetry
+
+
+class LumaHistogram:
+    # 0.1 L* wide bins, so BLACK_THR and WHITE_THR fall exactly on bin edges
+    BINS = 1000
+    BIN_WIDTH = 100 / BINS
+
+    def __init__(self) -> None:
+        self.black_bins = int(round(LumaCalculator.BLACK_THR / self.BIN_WIDTH))
+        self.white_bins = int(round(LumaCalculator.WHITE_THR / self.BIN_WIDTH))
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.BINS, dtype=np.int64)
+        self.luma_sums = np.zeros(self.BINS)
+        self.lightness_sums = np.zeros(self.BINS)
+        # sums of logs per bin, the geometric means are then exact and not taken from bin centres
+        self.log_luma_sums = np.zeros(self.BINS)
+        self.log_lightness_sums = np.zeros(self.BINS)
+        self.zeros = 0
+        self.frames = 0
+
+    def add(self, pic: np.ndarray):
+        luma_vector, lightness_vector = LumaCalculator.picture_lightness(pic)
+        idx = np.minimum((lightness_vector / self.BIN_WIDTH).astype(np.intp),
+                         self.BINS - 1)
+        self.counts += np.bincount(idx, minlength=self.BINS)
+        self.luma_sums += np.bincount(idx, luma_vector, self.BINS)
+        self.lightness_sums += np.bincount(idx, lightness_vector, self.BINS)
+        positive = luma_vector > 0
+        self.log_luma_sums += np.bincount(idx[positive], np.log(luma_vector[positive]), self.BINS)
+        self.log_lightness_sums += np.bincount(idx[positive], np.log(lightness_vector[positive]), self.BINS)
+        self.zeros += luma_vector.size - np.count_nonzero(positive)
+        self.frames += 1
+
+    def merge(self, other: "LumaHistogram"):
+        self.counts += other.counts
+        self.luma_sums += other.luma_sums
+        self.lightness_sums += other.lightness_sums
+        self.log_luma_sums += other.log_luma_sums
+        self.log_lightness_sums += other.log_lightness_sums
+        self.zeros += other.zeros
+        self.frames += other.frames
+
+    def empty(self) -> bool:
+        return self.frames == 0
+
+    def telemetry(self, roi: str = "frame", timestamp: datetime = None) -> LumaTelemetry:
+        total = self.counts.sum()
+        mean_luma = self.luma_sums.sum() / total
+        geom_mean_luma = self.__geometric_mean(
+            self.counts, self.log_luma_sums, total)
+
+        timestamp = timestamp or datetime.now()
+        return LumaTelemetry(*(timestamp.isoformat(sep=" "), mean_luma, geom_mean_luma) + self.__calculate_lightness_values(np.ones(self.BINS, dtype=bool)) + self.__calculate_lightness_values(self.__filtered_bins()), roi=roi)
+
+    def __filtered_bins(self) -> np.ndarray:
+        total = self.counts.sum()
+        black = self.counts[:self.black_bins].sum() / total
+        white = self.counts[self.white_bins:].sum() / total
+
+        keep = np.ones(self.BINS, dtype=bool)
+        if black < LumaCalculator.BLACK_LIM:
+            keep[:self.black_bins] = False
+        if white < LumaCalculator.WHITE_LIM:
+            keep[self.white_bins:] = False
+        return keep
+
+    def __calculate_lightness_values(self, keep: np.ndarray) -> Tuple[float, float, float]:
+        counts = np.where(keep, self.counts, 0)
+        total = counts.sum()
+        mean_perc_lightness = np.dot(keep, self.lightness_sums) / total
+        median_perc_lightness = self.__median(counts, total)
+        geom_mean_perc_lightness = self.__geometric_mean(
+            counts, np.where(keep, self.log_lightness_sums, 0), total)
+        return (mean_perc_lightness, median_perc_lightness, geom_mean_perc_lightness)
+
+    def __geometric_mean(self, counts: np.ndarray, log_sums: np.ndarray, total: int) -> float:
+        # exact zeros all land in the first bin and zero the mean like in LumaCalculator
+        if self.zeros > 0 and counts[0] > 0:
+            return 0.0
+        return float(np.exp(log_sums.sum() / total))
+
+    def __median(self, counts: np.ndarray, total: int) -> float:
+        cumulative = np.cumsum(counts)
+        half = total / 2
+        i = int(np.searchsorted(cumulative, half))
+        below = cumulative[i] - counts[i]
+        return (i + (half - below) / counts[i]) * self.BIN_WIDTH
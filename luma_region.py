@@ -0,0 +1,47 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+
+class LumaRegion:
+    def __init__(self, name, frame_width, frame_height, rect=None, polygon=None, stride=1) -> None:
+        self.name = name
+        self.stride = stride
+
+        if polygon is not None:
+            polygon = np.array(polygon, dtype=np.int32)
+            x0, y0 = polygon.min(axis=0)
+            x1, y1 = polygon.max(axis=0) + 1
+        elif rect is not None:
+            x0, y0, x1, y1 = rect
+        else:
+            x0, y0, x1, y1 = 0, 0, frame_width, frame_height
+
+        x0, x1 = max(0, x0), min(frame_width, x1)
+        y0, y1 = max(0, y0), min(frame_height, y1)
+        # an empty region would report NaN for every window
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"Luma region {name} lies outside the {frame_width}x{frame_height} frame")
+        self.rows = slice(y0, y1, stride)
+        self.cols = slice(x0, x1, stride)
+
+        self.mask = None
+        if polygon is not None:
+            mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            cv2.fillPoly(mask, [polygon - (x0, y0)], 1)
+            self.mask = mask[::stride, ::stride].astype(bool)
+            if not self.mask.any():
+                raise ValueError(f"Luma region {name} has no pixels at stride {stride}")
+
+    def extract(self, frame: np.ndarray) -> np.ndarray:
+        view = frame[self.rows, self.cols]
+        if self.mask is None:
+            return view.copy()
+        return view[self.mask]
+
+    @staticmethod
+    def from_config(config, frame_width, frame_height) -> List["LumaRegion"]:
+        stride = config.get('luma_stride', 1)
+        rois = config.get('luma_rois') or [{"name": "frame"}]
+        return [LumaRegion(roi['name'], frame_width, frame_height, roi.get('rect'), roi.get('polygon'), stride) for roi in rois]
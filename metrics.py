@@ -0,0 +1,250 @@
+import bisect
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+PREFIX = "people_counter_"
+# upper bounds in seconds, from a fast numpy call up to a slow network round trip
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    # recent samples for the percentiles of the summary line
+    WINDOW = 512
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=self.WINDOW)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+
+class Timer:
+    __slots__ = ("metrics", "stage", "labels", "start")
+
+    def __init__(self, metrics, stage, labels) -> None:
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, **self.labels)
+
+
+class Metrics:
+    def __init__(self, registry=None, labels=()) -> None:
+        self.registry = registry or Registry()
+        self.labels = labels
+        # histograms of stages observed without extra labels, skips building the key on every frame
+        self.stages = {}
+        self.counter_keys = {}
+
+    def with_labels(self, **labels) -> "Metrics":
+        return Metrics(self.registry, self.__key_labels(labels))
+
+    def time(self, stage, **labels) -> Timer:
+        return Timer(self, stage, labels)
+
+    def observe(self, stage, seconds, **labels):
+        histogram = None if labels else self.stages.get(stage)
+        if histogram is None:
+            histogram = self.__histogram(stage, labels)
+        with self.registry.lock:
+            histogram.observe(seconds)
+
+    def __histogram(self, stage, labels):
+        key = ("stage_seconds", self.__key_labels({"stage": stage, **labels}))
+        with self.registry.lock:
+            histogram = self.registry.histograms.setdefault(key, Histogram())
+        if not labels:
+            self.stages[stage] = histogram
+        return histogram
+
+    def inc(self, name, value=1, **labels):
+        key = None if labels else self.counter_keys.get(name)
+        if key is None:
+            key = (name, self.__key_labels(labels))
+            if not labels:
+                self.counter_keys[name] = key
+        with self.registry.lock:
+            self.registry.counters[key] = self.registry.counters.get(key, 0) + value
+
+    def gauge(self, name, fn, **labels):
+        # evaluated on export only, so depths and sizes cost nothing per frame
+        with self.registry.lock:
+            self.registry.gauges[(name, self.__key_labels(labels))] = fn
+
+    def __key_labels(self, labels):
+        return tuple(sorted({**dict(self.labels), **labels}.items()))
+
+    def snapshot(self):
+        with self.registry.lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, list(h.recent))
+                          for (key, h) in self.registry.histograms.items()}
+            counters = dict(self.registry.counters)
+            gauges = dict(self.registry.gauges)
+        return histograms, counters, {key: float(fn()) for (key, fn) in gauges.items()}
+
+    def prometheus(self) -> str:
+        histograms, counters, gauges = self.snapshot()
+        lines = []
+        for (kind, values) in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for (name, _) in values}):
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                lines.extend(f"{PREFIX}{name}{format_labels(labels)} {value}"
+                             for ((other, labels), value) in values.items() if other == name)
+
+        for name in sorted({name for (name, _) in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for ((other, labels), (counts, total, count, _)) in histograms.items():
+                if other != name:
+                    continue
+                cumulative = np.cumsum(counts)
+                for (bound, value) in zip(BUCKETS + ("+Inf",), cumulative):
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(labels + (('le', bound),))} {value}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, rates) -> str:
+        histograms, counters, gauges = self.snapshot()
+        parts = [f"{describe('fps', labels)} {value:.1f}" for (labels, value) in rates]
+        for ((_, labels), (_, _, _, recent)) in sorted(histograms.items()):
+            if len(recent) > 0:
+                (p50, p99) = np.percentile(recent, [50, 99]) * 1000
+                stage = dict(labels)["stage"]
+                other = tuple(label for label in labels if label[0] != "stage")
+                parts.append(f"{describe(stage, other)} {p50:.1f}/{p99:.1f}ms")
+        parts.extend(f"{describe(name, labels)} {value:g}"
+                     for ((name, labels), value) in sorted({**counters, **gauges}.items()) if name != "frames_total")
+        return "metrics: " + " | ".join(parts)
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullMetrics:
+    # used when metrics are disabled, every call returns immediately
+    TIMER = NullTimer()
+
+    def with_labels(self, **labels):
+        return self
+
+    def time(self, stage, **labels):
+        return self.TIMER
+
+    def observe(self, stage, seconds, **labels):
+        pass
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def gauge(self, name, fn, **labels):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def format_labels(labels, braces=True):
+    if len(labels) == 0:
+        return ""
+    if not braces:
+        return ",".join(str(value) for (_, value) in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, value) in labels) + "}"
+
+
+def describe(name, labels):
+    return f"{name} {format_labels(labels, False)}" if len(labels) > 0 else name
+
+
+class MetricsService(Metrics):
+    def __init__(self, host="127.0.0.1", port=None, log_interval=60) -> None:
+        super().__init__()
+        self.log_interval = log_interval
+        self.stopped = Event()
+
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), self.__handler())
+            Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.thread = None
+        if log_interval > 0:
+            self.thread = Thread(target=self.log, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def log(self):
+        previous, last = {}, time.monotonic()
+        while not self.stopped.wait(self.log_interval):
+            now = time.monotonic()
+            frames = {labels: value for ((name, labels), value) in self.snapshot()[1].items()
+                      if name == "frames_total"}
+            rates = [(labels, (value - previous.get(labels, 0)) / (now - last))
+                     for (labels, value) in sorted(frames.items())]
+            previous, last = frames, now
+            print(self.summary(rates), flush=True)
+
+    def __handler(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def make_metrics(config):
+    settings = config.get('metrics')
+    if settings is None:
+        return NULL_METRICS
+    return MetricsService(settings.get('host', "127.0.0.1"), settings.get('port'), settings.get('log_interval', 60))
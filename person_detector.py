@@ -0,0 +1,176 @@
+from queue import Empty, Queue
+from threading import Thread
+
+import cv2
+import numpy as np
+
+from bounded_queue import STOP
+from metrics import NULL_METRICS
+
+NET_CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat",
+               "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
+               "dog", "horse", "motorbike", "person", "pottedplant", "sheep",
+               "sofa", "train", "tvmonitor"]
+PERSON_CLASS = NET_CLASSES.index("person")
+# blobFromImages always got the mean as a bare 127.5, which OpenCV turns into the scalar
+# (127.5, 0, 0), so only the first channel is centered; kept to leave detections unchanged
+BLOB_MEAN = np.array([127.5, 0, 0], dtype=np.float32).reshape(1, 3, 1, 1)
+
+
+# names accepted in the config, constants missing from the installed OpenCV build are left out
+BACKENDS = {name: getattr(cv2.dnn, constant) for (name, constant) in (
+    ("default", "DNN_BACKEND_DEFAULT"), ("opencv", "DNN_BACKEND_OPENCV"),
+    ("openvino", "DNN_BACKEND_INFERENCE_ENGINE"), ("cuda", "DNN_BACKEND_CUDA")) if hasattr(cv2.dnn, constant)}
+TARGETS = {name: getattr(cv2.dnn, constant) for (name, constant) in (
+    ("cpu", "DNN_TARGET_CPU"), ("cpu_fp16", "DNN_TARGET_CPU_FP16"), ("opencl", "DNN_TARGET_OPENCL"),
+    ("opencl_fp16", "DNN_TARGET_OPENCL_FP16"), ("myriad", "DNN_TARGET_MYRIAD"),
+    ("cuda", "DNN_TARGET_CUDA"), ("cuda_fp16", "DNN_TARGET_CUDA_FP16")) if hasattr(cv2.dnn, constant)}
+
+
+def iou(a, b):
+    # intersection over union of every pair of (x0, y0, x1, y1) boxes in a and b
+    a, b = np.asarray(a, dtype="float"), np.asarray(b, dtype="float")
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class PersonDetector:
+    # MobileNet-SSD was trained on 300x300 inputs
+    INPUT_SIZE = (300, 300)
+
+    def __init__(self, frame_width, frame_height, confidence, input_size=INPUT_SIZE, backend="default", target="cpu") -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown DNN backend: {backend}")
+        if target not in TARGETS:
+            raise ValueError(f"Unknown DNN target: {target}")
+
+        self.net = cv2.dnn.readNetFromCaffe(
+            "mobilenet_ssd/MobileNetSSD_deploy.prototxt", "mobilenet_ssd/MobileNetSSD_deploy.caffemodel")
+        self.net.setPreferableBackend(BACKENDS[backend])
+        self.net.setPreferableTarget(TARGETS[target])
+
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        # None feeds every frame at its own size, as the detector originally did
+        self.input_size = None if input_size is None else tuple(input_size)
+        self.confidence_limit = confidence
+        # resized frames and blobs by batch and input size, reused by every forward pass
+        self.buffers = {}
+
+    def quantize(self, frames):
+        if not hasattr(self.net, "quantize"):
+            raise ValueError("INT8 inference needs OpenCV 4.5.4 or newer")
+        self.net = self.net.quantize([self.__blob(frames)], cv2.CV_32F, cv2.CV_32F)
+
+    def warm_up(self):
+        # the first forward pass allocates the layers, better at startup than on the first frame
+        if self.input_size is not None:
+            (width, height) = self.input_size
+            self.detect(np.zeros((height, width, 3), dtype=np.uint8))
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        self.net.setInput(self.__blob(frames))
+
+        # rows of [image id, class id, confidence, x0, y0, x1, y1] in relative coordinates
+        detections = self.net.forward()[0, 0]
+        detections = detections[(detections[:, 2] > self.confidence_limit)
+                                & (detections[:, 1].astype("int") == PERSON_CLASS)]
+
+        image_ids = detections[:, 0].astype("int")
+        sizes = np.array([frame.shape[1::-1] for frame in frames], dtype="float")
+        scaled = (detections[:, 3:7] * np.tile(sizes, 2)[image_ids]).astype("int")
+
+        boxes = [[] for _ in frames]
+        for (image_id, box) in zip(image_ids, scaled):
+            boxes[image_id].append(tuple(box))
+        return boxes
+
+    def __blob(self, frames):
+        input_size = self.input_size or frames[0].shape[1::-1]
+        key = (len(frames), input_size)
+        if key not in self.buffers:
+            (width, height) = input_size
+            self.buffers[key] = (np.empty((len(frames), height, width, 3), dtype=np.uint8),
+                                 np.empty((len(frames), 3, height, width), dtype=np.float32))
+        (resized, blob) = self.buffers[key]
+
+        for (frame, dst) in zip(frames, resized):
+            cv2.resize(frame, input_size, dst=dst)
+        # what blobFromImages computes: (pixel - mean) * scale with channels first
+        np.subtract(resized.transpose(0, 3, 1, 2), BLOB_MEAN, out=blob, dtype=np.float32)
+        np.multiply(blob, 0.007843, out=blob)
+        return blob
+
+
+class DetectorClient:
+    def __init__(self, service: "AsyncDetector") -> None:
+        self.service = service
+        self.results = Queue()
+        self.pending = 0
+
+    def busy(self) -> bool:
+        return self.pending > 0
+
+    def submit(self, frame):
+        self.pending += 1
+        self.service.stage(self, frame.copy())
+
+    def poll(self):
+        try:
+            boxes = self.results.get_nowait()
+        except Empty:
+            return None
+        self.pending -= 1
+        return boxes
+
+
+class AsyncDetector:
+    def __init__(self, detector: PersonDetector, metrics=NULL_METRICS) -> None:
+        self.detector = detector
+        self.metrics = metrics
+        self.requests = Queue()
+        self.clients = []
+        # refresh frames of the current round, sent to the detector thread as one batch
+        self.staged = []
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def client(self) -> DetectorClient:
+        client = DetectorClient(self)
+        self.clients.append(client)
+        return client
+
+    def stop(self):
+        self.requests.put(STOP)
+        self.thread.join()
+
+    def stage(self, client, frame):
+        self.staged.append((client, frame))
+        if len(self.staged) >= len(self.clients):
+            self.flush()
+
+    def flush(self):
+        # called once every camera had its turn, so a round needs a single forward pass
+        if len(self.staged) > 0:
+            self.requests.put(self.staged)
+            self.staged = []
+
+    def run(self):
+        while True:
+            batch = self.requests.get()
+            if batch is STOP:
+                break
+            with self.metrics.time("detect_batch"):
+                boxes = self.detector.detect_batch([frame for _, frame in batch])
+            self.metrics.inc("detect_batch_frames_total", len(batch))
+            for ((client, _), client_boxes) in zip(batch, boxes):
+                client.results.put(client_boxes)
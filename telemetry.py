@@ -1,10 +1,15 @@
 import enum
+import json
 import time
-from dataclasses import dataclass
-from threading import Thread
-from queue import Queue
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from threading import Semaphore, Thread
+from queue import Empty, Queue
+from typing import Optional
 
-from tb_device_mqtt import TBDeviceMqttClient, TBPublishInfo
+from bounded_queue import STOP
+from metrics import NULL_METRICS
+from telemetry_spool import TelemetrySpool
 
 
 class TelemetryType(enum.Enum):
@@ -16,9 +21,10 @@ class TelemetryType(enum.Enum):
 class EntryTelemetry:
     timestamp: str
     direction: str
+    line: str = "entrance"
 
     def as_dict(self):
-        return {"timestamp": self.timestamp, "direction": self.direction}
+        return {"timestamp": self.timestamp, "direction": self.direction, "line": self.line}
 
 
 @dataclass
@@ -32,6 +38,7 @@ class LumaTelemetry:
     mean_filtered_lightness: float
     geom_mean_filtered_lightness: float
     median_filtered_lightness: float
+    roi: str = "frame"
 
     def as_dict(self):
         return {
@@ -43,7 +50,8 @@ class LumaTelemetry:
             "median lightness": self.median_lightness,
             "mean filtered lightness": self.mean_filtered_lightness,
             "geometric mean filtered lightness": self.geom_mean_filtered_lightness,
-            "median filtered lightness": self.median_filtered_lightness
+            "median filtered lightness": self.median_filtered_lightness,
+            "roi": self.roi
         }
 
 
@@ -51,39 +59,137 @@ class LumaTelemetry:
 class TelemetryWrapper:
     type: TelemetryType
     telemetry: EntryTelemetry | LumaTelemetry
+    created: float = field(default_factory=time.time)
+    device: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({"type": self.type.value, "telemetry": asdict(self.telemetry), "created": self.created, "device": self.device})
+
+    @staticmethod
+    def from_json(payload: str) -> "TelemetryWrapper":
+        record = json.loads(payload)
+        telemetry_type = TelemetryType(record["type"])
+        telemetry_cls = EntryTelemetry if telemetry_type == TelemetryType.T_ENTRY else LumaTelemetry
+        return TelemetryWrapper(telemetry_type, telemetry_cls(**record["telemetry"]), record["created"], record.get("device"))
+
+    def as_ts_dict(self):
+        values = self.telemetry.as_dict()
+        ts = datetime.fromisoformat(values["timestamp"]).timestamp()
+        return {"ts": int(ts * 1000), "values": values}
 
 
 class TelemetrySender:
-    def __init__(self, host: str, entry_at: str, luma_at: str, telemetry_queue: Queue):
-        self.entry_client = TBDeviceMqttClient(
-            host=host, username=entry_at)
-        self.entry_client.connect()
+    MAX_INFLIGHT_BATCHES = 8
+    RECONNECT_POLL = 1.0
 
-        self.luma_client = TBDeviceMqttClient(
-            host=host, username=luma_at)
-        self.luma_client.connect()
+    def __init__(self, transport, telemetry_queue: Queue, batch_size=32, flush_interval=0.05, spool_path=None, metrics=NULL_METRICS):
+        self.transport = transport
+        self.transport.connect()
 
         self.telemetry_queue: Queue = telemetry_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool = None if spool_path is None else TelemetrySpool(spool_path)
+        self.metrics = metrics
+        if self.spool is not None:
+            # COUNT(*) runs only when metrics are scraped
+            metrics.gauge("spool_size", self.spool.size)
+        self.sent = 0
+        self.failed = 0
+        self.retry_at = 0
+
+        self.acks = Queue()
+        self.inflight = Semaphore(self.MAX_INFLIGHT_BATCHES)
+        self.ack_thread = Thread(target=self.wait_acks, daemon=False)
+        self.ack_thread.start()
 
         self.thread = Thread(target=self.send, daemon=False)
         self.thread.start()
 
-    def __del__(self):
-        self.entry_client.disconnect()
-        self.luma_client.disconnect()
+    def stop(self):
+        self.telemetry_queue.put(STOP)
+        self.thread.join()
+        self.acks.put(STOP)
+        self.ack_thread.join()
+        self.transport.disconnect()
+        if self.spool is not None:
+            self.spool.close()
 
     def send(self):
+        stopped = False
+        while not stopped:
+            if self.spool is None:
+                batch, stopped = self.__collect_batch(None)
+                self.__publish(TelemetryType.T_ENTRY, batch)
+                self.__publish(TelemetryType.T_LUMA, batch)
+                continue
+
+            batch, stopped = self.__collect_batch(
+                0 if self.__can_drain() else self.RECONNECT_POLL)
+            with self.metrics.time("spool"):
+                self.spool.append([wrapped.to_json() for wrapped in batch])
+            if self.__can_drain():
+                self.__drain_spool()
+
+    def wait_acks(self):
         while True:
-            if not self.telemetry_queue.empty():
-                wrapped = self.telemetry_queue.get()
-                response = None
-                if wrapped.type == TelemetryType.T_ENTRY:
-                    response = self.entry_client.send_telemetry(wrapped.telemetry.as_dict())
-                elif wrapped.type == TelemetryType.T_LUMA:
-                    response = self.luma_client.send_telemetry(wrapped.telemetry.as_dict())
-                if response == None:
-                    raise Exception("Bad telemetry type")
-                if response.get() != TBPublishInfo.TB_ERR_SUCCESS:
-                    Exception("Telemetry was not sent")
-            time.sleep(0.1)
-            
\ No newline at end of file
+            ack = self.acks.get()
+            if ack is STOP:
+                break
+            response, ids, telemetry_type, published = ack
+            success = response.get()
+            self.metrics.observe("publish", time.perf_counter() - published, type=telemetry_type.name)
+            if success:
+                self.sent += len(ids)
+                self.metrics.inc("telemetry_sent_total", len(ids), type=telemetry_type.name)
+            else:
+                self.failed += len(ids)
+                self.metrics.inc("telemetry_failed_total", len(ids), type=telemetry_type.name)
+
+            if self.spool is not None and success:
+                self.spool.ack(ids)
+            elif self.spool is not None:
+                self.retry_at = time.monotonic() + self.RECONNECT_POLL
+                self.spool.retry(ids)
+            self.inflight.release()
+
+    def __can_drain(self):
+        if time.monotonic() < self.retry_at:
+            return False
+        return self.transport.is_connected() and self.spool.backlog()
+
+    def __drain_spool(self):
+        rows = self.spool.next_batch(self.batch_size)
+        batch = [TelemetryWrapper.from_json(payload) for _, payload in rows]
+        ids = [i for i, _ in rows]
+        self.__publish(TelemetryType.T_ENTRY, batch, ids)
+        self.__publish(TelemetryType.T_LUMA, batch, ids)
+
+    def __collect_batch(self, timeout):
+        batch = []
+        try:
+            wrapped = self.telemetry_queue.get(timeout=timeout)
+        except Empty:
+            return (batch, False)
+        deadline = time.monotonic() + self.flush_interval
+        while wrapped is not STOP:
+            batch.append(wrapped)
+            timeout = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or timeout <= 0:
+                return (batch, False)
+            try:
+                wrapped = self.telemetry_queue.get(timeout=timeout)
+            except Empty:
+                return (batch, False)
+        return (batch, True)
+
+    def __publish(self, telemetry_type, batch, ids=None):
+        ids = ids or [None] * len(batch)
+        selected = [(i, wrapped) for i, wrapped in zip(ids, batch)
+                    if wrapped.type == telemetry_type]
+        if len(selected) == 0:
+            return
+        self.inflight.acquire()
+        published = time.perf_counter()
+        self.acks.put((self.transport.publish(telemetry_type, [wrapped for _, wrapped in selected]),
+                       [i for i, _ in selected], telemetry_type, published))
@@ -0,0 +1,61 @@
+import sqlite3
+from threading import Lock
+from typing import List, Tuple
+
+
+class TelemetrySpool:
+    def __init__(self, path: str) -> None:
+        self.lock = Lock()
+        self.db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)")
+        # rows up to the cursor were handed out, failed ones wait in retries to be handed out again
+        self.cursor = 0
+        self.retries = []
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def append(self, payloads: List[str]):
+        if len(payloads) == 0:
+            return
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO spool (payload) VALUES (?)", [(p,) for p in payloads])
+
+    def next_batch(self, limit: int) -> List[Tuple[int, str]]:
+        with self.lock:
+            retries = self.retries[:limit]
+            del self.retries[:limit]
+            rows = self.db.execute(
+                f"SELECT id, payload FROM spool WHERE id IN ({', '.join('?' * len(retries))}) ORDER BY id",
+                retries).fetchall()
+            fresh = self.db.execute(
+                "SELECT id, payload FROM spool WHERE id > ? ORDER BY id LIMIT ?",
+                (self.cursor, limit - len(rows))).fetchall()
+            if len(fresh) > 0:
+                self.cursor = fresh[-1][0]
+            return rows + fresh
+
+    def ack(self, ids: List[int]):
+        with self.lock, self.db:
+            self.db.executemany(
+                "DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, ids: List[int]):
+        # rewinding the cursor instead would also resend the rows still in flight
+        with self.lock:
+            self.retries = sorted(self.retries + ids)
+
+    def backlog(self) -> bool:
+        with self.lock:
+            return len(self.retries) > 0 or \
+                self.db.execute("SELECT 1 FROM spool WHERE id > ? LIMIT 1", (self.cursor,)).fetchone() is not None
+
+    def size(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
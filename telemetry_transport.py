@@ -0,0 +1,159 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import List
+
+from telemetry import TelemetryType, TelemetryWrapper
+
+
+class PublishResult:
+    def __init__(self, success=True) -> None:
+        self.success = success
+
+    def get(self) -> bool:
+        return self.success
+
+
+class TelemetryTransport(ABC):
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    @abstractmethod
+    def publish(self, telemetry_type: TelemetryType, batch: List[TelemetryWrapper]) -> PublishResult:
+        pass
+
+    @staticmethod
+    def from_config(config) -> "TelemetryTransport":
+        kind = config.get('telemetry_transport', "thingsboard")
+        if kind == "thingsboard":
+            entry_ats = [config['entry_at']] + [camera['entry_at']
+                                                for camera in config.get('cameras') or []]
+            return ThingsBoardTransport(config['iot_server_addr'], entry_ats, config['luma_at'])
+        if kind == "file":
+            return FileTransport(config.get('telemetry_file', "telemetry.ndjson"))
+        if kind == "mock":
+            return MockTransport()
+        raise ValueError(f"Unknown telemetry transport: {kind}")
+
+
+class ThingsBoardResult(PublishResult):
+    def __init__(self, infos) -> None:
+        self.infos = infos
+
+    def get(self) -> bool:
+        from tb_device_mqtt import TBPublishInfo
+        return all([info.get() == TBPublishInfo.TB_ERR_SUCCESS for info in self.infos])
+
+
+class ThingsBoardTransport(TelemetryTransport):
+    RECONNECT_DELAY = 5.0
+
+    def __init__(self, host: str, entry_ats: List[str], luma_at: str) -> None:
+        from tb_device_mqtt import TBDeviceMqttClient
+
+        # entry telemetry without a device goes to the first entry token
+        self.default_entry_at = entry_ats[0]
+        self.luma_at = luma_at
+        self.clients = {token: TBDeviceMqttClient(host=host, username=token)
+                        for token in dict.fromkeys(entry_ats + [luma_at])}
+        self.stopped = Event()
+        self.thread = None
+
+    def connect(self):
+        # the broker may be down when the service starts, telemetry is spooled until
+        # is_connected() reports every client connected
+        self.thread = Thread(target=self.__connect_clients, daemon=True)
+        self.thread.start()
+
+    def __connect_clients(self):
+        pending = list(self.clients.values())
+        reported = False
+        while not self.stopped.is_set():
+            # each client blocks until its broker answers, so the devices connect side by side
+            with ThreadPoolExecutor(len(pending)) as pool:
+                errors = list(pool.map(ThingsBoardTransport.__try_connect, pending))
+            failed = [(client, error) for (client, error) in zip(pending, errors) if error is not None]
+            if len(failed) == 0:
+                break
+            if not reported:
+                print(f"ThingsBoard connection failed, retrying every {self.RECONNECT_DELAY} s:", failed[0][1])
+                reported = True
+            pending = [client for (client, _) in failed]
+            self.stopped.wait(self.RECONNECT_DELAY)
+
+    @staticmethod
+    def __try_connect(client):
+        # once connected, the MQTT client reconnects by itself
+        try:
+            client.connect()
+        except OSError as error:
+            return error
+        return None
+
+    def disconnect(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        for client in self.clients.values():
+            client.disconnect()
+
+    def is_connected(self) -> bool:
+        return all(client.is_connected() for client in self.clients.values())
+
+    def publish(self, telemetry_type, batch):
+        by_device = {}
+        for wrapped in batch:
+            by_device.setdefault(self.__device(wrapped), []).append(
+                wrapped.as_ts_dict())
+        return ThingsBoardResult([self.clients[device].send_telemetry(values) for (device, values) in by_device.items()])
+
+    def __device(self, wrapped):
+        if wrapped.type == TelemetryType.T_LUMA:
+            return self.luma_at
+        return wrapped.device or self.default_entry_at
+
+
+class MockTransport(TelemetryTransport):
+    def __init__(self, publish_delay=0.0) -> None:
+        self.publish_delay = publish_delay
+        self.latencies = []
+        self.published = {telemetry_type: 0 for telemetry_type in TelemetryType}
+        self.lock = Lock()
+
+    def publish(self, telemetry_type, batch):
+        if self.publish_delay > 0:
+            time.sleep(self.publish_delay)
+        now = time.time()
+        with self.lock:
+            self.latencies.extend(now - wrapped.created for wrapped in batch)
+            self.published[telemetry_type] += len(batch)
+        return PublishResult()
+
+
+class FileTransport(TelemetryTransport):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = None
+
+    def connect(self):
+        self.file = open(self.path, "a")
+
+    def disconnect(self):
+        self.file.close()
+
+    def publish(self, telemetry_type, batch):
+        for wrapped in batch:
+            record = wrapped.as_ts_dict()
+            record["type"] = telemetry_type.name
+            record["device"] = wrapped.device
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        return PublishResult()
@@ -0,0 +1,58 @@
+import importlib.util
+import unittest
+
+import numpy as np
+
+from centroid_tracker import ArrayCentroidTracker, CentroidTracker, distances
+
+MAX_DIST = 50
+
+
+def random_runs(seed, frames=150):
+    # people walk around a small frame, so they often come closer than MAX_DIST to each other
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(0, 200, size=(10, 2)).astype("float")
+    for _ in range(frames):
+        positions += rng.normal(0, 15, size=positions.shape)
+        visible = positions[rng.random(len(positions)) < 0.7]
+        sizes = rng.integers(10, 40, size=visible.shape)
+        yield np.hstack([visible - sizes, visible + sizes]).astype("int")
+
+
+def snapshot(objects):
+    return [(object_id, centroid.tolist()) for (object_id, centroid) in objects.items()]
+
+
+class VectorizedMatcherTest(unittest.TestCase):
+    def test_matches_the_greedy_tracker(self):
+        for seed in range(5):
+            greedy_evicted, vectorized_evicted = [], []
+            greedy = CentroidTracker(5, MAX_DIST, greedy_evicted.append)
+            vectorized = ArrayCentroidTracker(5, MAX_DIST, vectorized_evicted.append, "vectorized")
+            for rects in random_runs(seed):
+                self.assertEqual(snapshot(vectorized.update(rects)), snapshot(greedy.update(rects)))
+            self.assertEqual(vectorized_evicted, greedy_evicted)
+
+
+@unittest.skipUnless(importlib.util.find_spec("scipy"), "scipy is not installed")
+class HungarianMatcherTest(unittest.TestCase):
+    def test_pairs_beyond_the_gate_are_never_assigned(self):
+        for seed in range(5):
+            tracker = ArrayCentroidTracker(5, MAX_DIST, matcher="hungarian")
+            previous = {}
+            for rects in random_runs(seed):
+                objects = tracker.update(rects)
+                for (object_id, centroid) in objects.items():
+                    if object_id in previous:
+                        self.assertLessEqual(distances([previous[object_id]], [centroid])[0, 0], MAX_DIST)
+                previous = {object_id: centroid.copy() for (object_id, centroid) in objects.items()}
+
+    def test_a_far_pair_does_not_steal_a_close_match(self):
+        tracker = ArrayCentroidTracker(5, MAX_DIST, matcher="hungarian")
+        tracker.update([(0, 0, 0, 0), (30, 0, 30, 0)])
+        objects = tracker.update([(31, 0, 31, 0), (200, 0, 200, 0)])
+        self.assertEqual(snapshot(objects), [(0, [0, 0]), (1, [31, 0])])
+
+
+if __name__ == "__main__":
+    unittest.main()
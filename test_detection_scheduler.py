@@ -0,0 +1,56 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from detection_scheduler import make_scheduler
+from idle_gate import IdleGate
+from metrics import Metrics
+
+FRAME = np.zeros((226, 402, 3), dtype=np.uint8)
+
+
+def empty_tracker():
+    return SimpleNamespace(trackers=[], confidences=[], centroid_tracker=SimpleNamespace(objects={}))
+
+
+def counters(metrics, name):
+    return {dict(labels).get("reason", dict(labels).get("mode")): value
+            for ((other, labels), value) in metrics.snapshot()[1].items() if other == name}
+
+
+class DetectionSchedulerTest(unittest.TestCase):
+    def test_fixed_decisions_are_exported(self):
+        metrics = Metrics()
+        scheduler = make_scheduler({"skip_frames": 3}, metrics)
+        for _ in range(7):
+            scheduler.should_refresh(FRAME, empty_tracker())
+        self.assertEqual(counters(metrics, "detection_decisions_total"), {"fixed": 3, "skip": 4})
+        self.assertEqual(counters(metrics, "detection_decisions_total"), dict(scheduler.decisions))
+
+    def test_adaptive_decisions_are_exported(self):
+        metrics = Metrics()
+        scheduler = make_scheduler({"detection_schedule": "adaptive",
+                                    "adaptive_detection": {"max_interval": 4}}, metrics)
+        for _ in range(9):
+            scheduler.should_refresh(FRAME, empty_tracker())
+        self.assertEqual(counters(metrics, "detection_decisions_total"), dict(scheduler.decisions))
+
+
+class IdleGateTest(unittest.TestCase):
+    def test_frames_cpu_time_and_wake_latency_are_exported(self):
+        metrics = Metrics()
+        gate = IdleGate(idle_after=2, metrics=metrics)
+        frames = [FRAME] * 5 + [np.full_like(FRAME, 255)]
+        for frame in frames:
+            if gate.active(frame, empty_tracker()):
+                gate.processed()
+
+        self.assertEqual(counters(metrics, "idle_gate_frames_total"), gate.frames)
+        self.assertEqual(set(counters(metrics, "idle_gate_cpu_seconds_total")), {"active", "idle"})
+        histograms = metrics.snapshot()[0]
+        self.assertEqual(histograms[("stage_seconds", (("stage", "wake"),))][2], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from detector_calibration import precision_target
+from person_detector import TARGETS
+
+
+class PrecisionTest(unittest.TestCase):
+    def test_full_and_int8_precision_keep_the_target(self):
+        self.assertEqual(precision_target("fp32", "cpu"), "cpu")
+        self.assertEqual(precision_target("int8", "cpu"), "cpu")
+
+    def test_fp16_selects_the_half_precision_target(self):
+        for target in ("cpu", "opencl", "cuda"):
+            if f"{target}_fp16" in TARGETS:
+                self.assertEqual(precision_target("fp16", target), f"{target}_fp16")
+        self.assertEqual(precision_target("fp16", "cuda_fp16"), "cuda_fp16")
+
+    def test_fp16_without_a_half_precision_target_is_rejected(self):
+        with self.assertRaises(ValueError):
+            precision_target("fp16", "myriad")
+
+    def test_unknown_precision_is_rejected(self):
+        with self.assertRaises(ValueError):
+            precision_target("fp23", "cpu")
+
+
+if __name__ == "__main__":
+    unittest.main()
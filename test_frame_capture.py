@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from frame_capture import FrameCapture
+
+FRAMES = 60
+
+
+class FrameCaptureTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # every frame is a flat gray level equal to its index, so reads tell which frame they got
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "frames.avi")
+        writer = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (402, 226))
+        for i in range(FRAMES):
+            writer.write(np.full((226, 402, 3), i * 4, dtype=np.uint8))
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def wait_finished(self, capture):
+        while not capture.finished:
+            time.sleep(0.01)
+
+    def test_latest_mode_returns_the_newest_frame(self):
+        capture = FrameCapture(self.path, 402, "latest", 4).start()
+        self.wait_finished(capture)
+
+        frame = capture.read()
+        self.assertAlmostEqual(frame.mean() / 4, FRAMES - 1, delta=0.5)
+        self.assertIsNone(capture.read())
+        self.assertEqual(capture.captured, FRAMES)
+        self.assertEqual(capture.dropped, FRAMES - 1)
+        capture.stop()
+
+    def test_all_mode_returns_every_frame_in_order(self):
+        capture = FrameCapture(self.path, 402, "all", 4).start()
+        indices = []
+        while (frame := capture.read()) is not None:
+            indices.append(int(round(frame.mean() / 4)))
+        self.assertEqual(indices, list(range(FRAMES)))
+        self.assertEqual(capture.dropped, 0)
+        capture.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
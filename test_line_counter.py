@@ -0,0 +1,130 @@
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from line_counter import LineCounter
+
+WIDTH, HEIGHT = 400, 300
+
+
+class ReferenceCounter:
+    # the counting rule EntryTracker had before LineCounter, for the default line
+    def __init__(self) -> None:
+        self.centroids = {}
+        self.counted = set()
+
+    def update(self, objects):
+        events = []
+        for (object_id, centroid) in objects.items():
+            if object_id not in self.centroids:
+                self.centroids[object_id] = [centroid]
+                continue
+            mov_dir = centroid[1] - np.mean([c[1] for c in self.centroids[object_id]])
+            self.centroids[object_id].append(centroid)
+            if object_id in self.counted:
+                continue
+            if mov_dir < 0 and centroid[1] < HEIGHT // 2:
+                events.append(("entrance", "UP"))
+                self.counted.add(object_id)
+            elif mov_dir > 0 and centroid[1] > HEIGHT // 2:
+                events.append(("entrance", "DOWN"))
+                self.counted.add(object_id)
+        return events
+
+
+def random_tracks(seed, frames=200, people=12):
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, 100, people)
+    lengths = rng.integers(5, 80, people)
+    positions = rng.integers((0, 0), (WIDTH, HEIGHT), size=(people, 2))
+    steps = rng.integers(-6, 7, size=(people, 2))
+    for frame in range(frames):
+        objects = OrderedDict()
+        for person in range(people):
+            if starts[person] <= frame < starts[person] + lengths[person]:
+                objects[person] = positions[person] + (frame - starts[person]) * steps[person]
+        yield objects
+
+
+def track(points, object_id=0):
+    return [OrderedDict([(object_id, np.array(point))]) for point in points]
+
+
+class LineCounterTest(unittest.TestCase):
+    def test_default_line_matches_the_old_rule(self):
+        for seed in range(5):
+            (counter, reference) = (LineCounter(WIDTH, HEIGHT), ReferenceCounter())
+            for objects in random_tracks(seed):
+                self.assertEqual(sorted(counter.update(objects)), sorted(reference.update(objects)))
+
+    def test_ids_out_of_order_are_counted_once(self):
+        counter = LineCounter(WIDTH, HEIGHT)
+        events = []
+        for y in (100, 120, 140, 160, 180, 200):
+            events += counter.update(OrderedDict([(7, np.array((50, y))), (3, np.array((300, y))),
+                                                  (5, np.array((200, y)))]))
+        self.assertEqual(events, [("entrance", "DOWN")] * 3)
+        self.assertEqual(list(counter.ids), [3, 5, 7])
+
+    def test_multiple_and_bounded_lines(self):
+        lines = [{"name": "left", "p0": [0, 150], "p1": [200, 150], "bounded": True},
+                 {"name": "vertical", "p0": [300, 0], "p1": [300, 300]}]
+        counter = LineCounter(WIDTH, HEIGHT, lines)
+        events = []
+        # crosses the bounded line inside its segment, then the vertical one to the left
+        for point in [(100, 100), (100, 140), (100, 160), (100, 200)]:
+            events += counter.update(track([point])[0])
+        for point in [(350, 50), (320, 50), (280, 50)]:
+            events += counter.update(track([point], 1)[0])
+        # crosses the y of the bounded line outside its segment
+        for point in [(250, 100), (250, 140), (250, 160)]:
+            events += counter.update(track([point], 2)[0])
+        self.assertEqual(events, [("left", "DOWN"), ("vertical", "DOWN")])
+
+    def test_zone_in_and_out(self):
+        zones = [{"name": "door", "polygon": [[100, 100], [200, 100], [200, 200], [100, 200]]}]
+        counter = LineCounter(WIDTH, HEIGHT, zones=zones)
+        events = []
+        for point in [(50, 150), (150, 150), (160, 150), (250, 150), (150, 150)]:
+            events += counter.update(track([point])[0])
+        self.assertEqual(events, [("door", "IN"), ("door", "OUT"), ("door", "IN")])
+
+    def test_a_zone_entered_on_registration_is_not_counted(self):
+        zones = [{"name": "door", "polygon": [[100, 100], [200, 100], [200, 200], [100, 200]]}]
+        counter = LineCounter(WIDTH, HEIGHT, zones=zones)
+        events = []
+        for point in [(150, 150), (250, 150)]:
+            events += counter.update(track([point])[0])
+        self.assertEqual(events, [("door", "OUT")])
+
+    def test_evicted_objects_start_over(self):
+        counter = LineCounter(WIDTH, HEIGHT)
+        events = []
+        for y in (100, 140, 160):
+            events += counter.update(track([(50, y)])[0])
+        self.assertEqual(events, [("entrance", "DOWN")])
+
+        counter.evict(0)
+        counter.update(OrderedDict())
+        self.assertEqual(len(counter.ids), 0)
+        # the same id is a new object after eviction and can be counted again
+        events = []
+        for y in (200, 160, 140):
+            events += counter.update(track([(50, y)])[0])
+        self.assertEqual(events, [("entrance", "UP")])
+
+    def test_recent_centroids_are_the_last_points_oldest_first(self):
+        counter = LineCounter(WIDTH, HEIGHT, history_size=3)
+        points = [(10, y) for y in range(0, 60, 10)]
+        for (i, point) in enumerate(points):
+            counter.update(track([point])[0])
+            expected = points[max(0, i - 2):i + 1]
+            self.assertEqual(counter.recent_centroids(0).tolist(), [list(p) for p in expected])
+        self.assertEqual(counter.recent_centroids(1).shape, (0, 2))
+        self.assertEqual(LineCounter(WIDTH, HEIGHT).recent_centroids(0).shape, (0, 2))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
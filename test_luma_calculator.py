@@ -0,0 +1,100 @@
+import unittest
+from dataclasses import astuple
+from datetime import datetime
+from statistics import geometric_mean
+
+import numpy as np
+
+from luma_calculator import LumaCalculator
+from telemetry import LumaTelemetry
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class ScalarLumaCalculator:
+    # the original per-pixel implementation, kept as the reference for the vectorized one
+    def calculate(pic, timestamp):
+        luma_vector = ScalarLumaCalculator.picture_luma(pic)
+        lightness_vector = [ScalarLumaCalculator.luma_to_perc_lightness(
+            pix) for pix in luma_vector]
+        filtered_lightness_vector = ScalarLumaCalculator.filter_lightness_vector(
+            lightness_vector)
+
+        return LumaTelemetry(*(timestamp.isoformat(sep=" "), np.mean(luma_vector), geometric_mean(luma_vector)) + ScalarLumaCalculator.lightness_values(lightness_vector) + ScalarLumaCalculator.lightness_values(filtered_lightness_vector))
+
+    def lightness_values(lightness_vector):
+        return (np.mean(lightness_vector), np.median(lightness_vector), geometric_mean(lightness_vector))
+
+    def linearize_pixel(pixel):
+        def transform(channel):
+            if channel < 0.04045:
+                return channel / 12.92
+            return ((channel + 0.055) / 1.055) ** 2.4
+
+        return np.array([transform(c) for c in pixel])
+
+    def pixel_luma(pixel):
+        norm = np.array([1/255, 1/255, 1/255])
+        lin_pixel = ScalarLumaCalculator.linearize_pixel(pixel * norm)
+        multipliers = np.array([0.2126, 0.7152, 0.0722])
+        return np.dot(lin_pixel, multipliers)
+
+    def luma_to_perc_lightness(y):
+        return y * 903.3 if y <= 0.008856 else y ** (1 / 3) * 116 - 16
+
+    def picture_luma(pic):
+        return np.array([[ScalarLumaCalculator.pixel_luma(x) for x in r] for r in pic]).flatten()
+
+    def filter_lightness_vector(lightness_vector):
+        size = len(lightness_vector)
+        black = len(list(filter(lambda x: x < LumaCalculator.BLACK_THR, lightness_vector))) / size
+        white = len(list(filter(lambda x: x > LumaCalculator.WHITE_THR, lightness_vector))) / size
+        filtered = lightness_vector.copy()
+        if black < LumaCalculator.BLACK_LIM:
+            filtered = np.array(
+                list(filter(lambda x: LumaCalculator.BLACK_THR < x, filtered)))
+        if white < LumaCalculator.WHITE_LIM:
+            filtered = np.array(
+                list(filter(lambda x: x < LumaCalculator.WHITE_THR, filtered)))
+        return filtered
+
+
+class LumaCalculatorTest(unittest.TestCase):
+    # the lightness lookup table interpolates L* with an error of about 1e-3
+    LIGHTNESS_TOLERANCE = 2e-3
+
+    def assert_parity(self, pic):
+        expected = astuple(ScalarLumaCalculator.calculate(pic, TIMESTAMP))
+        actual = astuple(LumaCalculator.calculate(pic, "frame", TIMESTAMP))
+
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[-1], expected[-1])
+        np.testing.assert_allclose(actual[1:3], expected[1:3], rtol=1e-9)
+        np.testing.assert_allclose(actual[3:-1], expected[3:-1], rtol=0, atol=self.LIGHTNESS_TOLERANCE)
+
+    def test_random_frames(self):
+        rng = np.random.default_rng(0)
+        for _ in range(5):
+            # zero pixels are left out, the reference geometric mean rejects them
+            self.assert_parity(rng.integers(1, 256, (24, 32, 3), dtype=np.uint8))
+
+    def test_dark_and_bright_frames(self):
+        rng = np.random.default_rng(1)
+        # mostly black and mostly white frames switch the filter off for that side
+        self.assert_parity(rng.integers(1, 30, (24, 32, 3), dtype=np.uint8))
+        self.assert_parity(rng.integers(230, 256, (24, 32, 3), dtype=np.uint8))
+
+    def test_float_frames(self):
+        pic = np.random.default_rng(2).integers(1, 256, (24, 32, 3), dtype=np.uint8)
+        # non 8-bit frames skip the lookup tables for the luma
+        self.assert_parity(pic.astype(np.float64))
+
+    def test_black_pixel_gives_zero_geometric_mean(self):
+        pic = np.full((8, 8, 3), 128, dtype=np.uint8)
+        pic[0, 0] = 0
+        telemetry = LumaCalculator.calculate(pic, "frame", TIMESTAMP)
+        self.assertEqual(telemetry.geom_mean_luma, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bounded_queue import BoundedQueue
+from luma_device import LumaDevice, LumaProcessDevice, LumaProcessor
+
+ROIS = ["r0", "r1", "r2", "r3"]
+
+
+class LumaDeviceTest(unittest.TestCase):
+    def test_every_region_of_a_sample_is_reported(self):
+        # more regions than queue slots, a sample must not push out its own regions
+        frame_queue = BoundedQueue(2, "drop_oldest")
+        telemetry_queue = BoundedQueue()
+        frame = np.random.default_rng(0).integers(0, 256, (50, 200, 3), dtype=np.uint8)
+        device = LumaDevice(frame_queue, telemetry_queue)
+        for _ in range(5):
+            frame_queue.put([(roi, frame[:, i * 50:(i + 1) * 50].copy()) for (i, roi) in enumerate(ROIS)])
+        device.stop()
+
+        reported = Counter()
+        while not telemetry_queue.empty():
+            reported[telemetry_queue.get_nowait().telemetry.roi] += 1
+        samples = 5 - frame_queue.dropped
+        self.assertEqual(reported, Counter({roi: samples for roi in ROIS}))
+
+    def test_process_device_reports_every_region(self):
+        telemetry_queue = BoundedQueue()
+        frame = np.random.default_rng(0).integers(0, 256, (50, 200, 3), dtype=np.uint8)
+        device = LumaProcessDevice(BoundedQueue(), telemetry_queue, frame.nbytes)
+        device.frame_queue.put([(roi, frame[:, i * 50:(i + 1) * 50].copy()) for (i, roi) in enumerate(ROIS)])
+        device.stop()
+
+        reported = []
+        while not telemetry_queue.empty():
+            reported.append(telemetry_queue.get_nowait().telemetry.roi)
+        self.assertEqual(sorted(reported), ROIS)
+
+    def test_process_device_stops_after_the_worker_died(self):
+        frame = np.zeros((50, 50, 3), dtype=np.uint8)
+        device = LumaProcessDevice(BoundedQueue(), BoundedQueue(), frame.nbytes, slots=1)
+        device.LIVENESS_INTERVAL = 0.05
+        device.process.kill()
+        device.process.join()
+        # more regions than slots, without the liveness check this blocks on a free slot forever
+        device.frame_queue.put([("r0", frame), ("r1", frame)])
+        device.stop()
+        self.assertTrue(device.failed.is_set())
+
+    def test_open_windows_are_reported_on_stop(self):
+        frame = np.random.default_rng(0).integers(0, 256, (50, 50, 3), dtype=np.uint8)
+        for device_class in (LumaDevice, LumaProcessDevice):
+            telemetry_queue = BoundedQueue()
+            if device_class is LumaDevice:
+                device = LumaDevice(BoundedQueue(), telemetry_queue, 3600)
+            else:
+                device = LumaProcessDevice(BoundedQueue(), telemetry_queue, frame.nbytes, 3600)
+            device.frame_queue.put([("r0", frame)])
+            device.stop()
+            self.assertEqual(telemetry_queue.get_nowait().telemetry.roi, "r0")
+            self.assertTrue(telemetry_queue.empty())
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = datetime(2024, 1, 1, 12, 0, 0)
+
+    def __call__(self):
+        return self.now
+
+
+class LumaProcessorTest(unittest.TestCase):
+    def test_flush_emits_the_open_windows(self):
+        clock = Clock()
+        processor = LumaProcessor(60, clock)
+        pixels = np.full((10, 10, 3), 128, dtype=np.uint8)
+        for roi in ROIS[:2]:
+            self.assertIsNone(processor.process(roi, pixels))
+        clock.now += timedelta(seconds=10)
+
+        telemetries = processor.flush()
+        self.assertEqual([telemetry.roi for telemetry in telemetries], ROIS[:2])
+        self.assertEqual(telemetries[0].timemstamp, clock.now.isoformat(sep=" "))
+        self.assertEqual(processor.flush(), [])
+
+    def test_flush_without_windows_is_empty(self):
+        processor = LumaProcessor(0)
+        processor.process("r0", np.zeros((4, 4, 3), dtype=np.uint8))
+        self.assertEqual(processor.flush(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from dataclasses import astuple
+from datetime import datetime
+
+import numpy as np
+
+from luma_calculator import LumaCalculator
+from luma_histogram import LumaHistogram
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class LumaHistogramTest(unittest.TestCase):
+    def assert_close(self, frames):
+        histogram = LumaHistogram()
+        for frame in frames:
+            histogram.add(frame)
+        actual = astuple(histogram.telemetry("frame", TIMESTAMP))
+        expected = astuple(LumaCalculator.calculate(np.concatenate(frames), "frame", TIMESTAMP))
+
+        # sums and log sums are exact, only the medians are interpolated within a bin;
+        # both fill the lightness fields in (mean, median, geometric mean) order
+        for i in (1, 2, 3, 5, 6, 8):
+            self.assertAlmostEqual(actual[i], expected[i], delta=1e-9 * max(abs(expected[i]), 1))
+        for i in (4, 7):
+            self.assertAlmostEqual(actual[i], expected[i], delta=LumaHistogram.BIN_WIDTH)
+
+    def test_single_frame(self):
+        rng = np.random.default_rng(0)
+        self.assert_close([rng.integers(1, 256, (40, 60, 3), dtype=np.uint8)])
+
+    def test_window_of_frames(self):
+        rng = np.random.default_rng(1)
+        self.assert_close([rng.integers(1, 256, (40, 60, 3), dtype=np.uint8) for _ in range(3)])
+
+    def test_dark_frames(self):
+        rng = np.random.default_rng(2)
+        self.assert_close([rng.integers(1, 40, (40, 60, 3), dtype=np.uint8) for _ in range(2)])
+
+    def test_merge_matches_a_single_histogram(self):
+        rng = np.random.default_rng(3)
+        frames = [rng.integers(0, 256, (20, 30, 3), dtype=np.uint8) for _ in range(2)]
+        merged, single = LumaHistogram(), LumaHistogram()
+        for frame in frames:
+            part = LumaHistogram()
+            part.add(frame)
+            merged.merge(part)
+            single.add(frame)
+        self.assertEqual(merged.telemetry("frame", TIMESTAMP), single.telemetry("frame", TIMESTAMP))
+
+    def test_black_pixel_gives_zero_geometric_mean(self):
+        pic = np.full((8, 8, 3), 128, dtype=np.uint8)
+        pic[0, 0] = 0
+        histogram = LumaHistogram()
+        histogram.add(pic)
+        self.assertEqual(histogram.telemetry("frame", TIMESTAMP).geom_mean_luma, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
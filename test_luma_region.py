@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from luma_region import LumaRegion
+
+WIDTH, HEIGHT = 40, 30
+
+
+class LumaRegionTest(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.arange(HEIGHT * WIDTH * 3, dtype=np.uint32).reshape(HEIGHT, WIDTH, 3)
+
+    def test_rect_is_clipped_to_the_frame(self):
+        region = LumaRegion("rect", WIDTH, HEIGHT, rect=(30, 20, 60, 50))
+        np.testing.assert_array_equal(region.extract(self.frame), self.frame[20:, 30:])
+
+    def test_polygon_selects_its_pixels(self):
+        region = LumaRegion("polygon", WIDTH, HEIGHT, polygon=[[0, 0], [9, 0], [9, 9], [0, 9]], stride=2)
+        np.testing.assert_array_equal(region.extract(self.frame), self.frame[0:10:2, 0:10:2].reshape(-1, 3))
+
+    def test_regions_outside_the_frame_are_rejected(self):
+        config = {"luma_rois": [{"name": "frame"}, {"name": "outside", "rect": [50, 0, 80, 10]}]}
+        with self.assertRaises(ValueError):
+            LumaRegion.from_config(config, WIDTH, HEIGHT)
+        with self.assertRaises(ValueError):
+            LumaRegion("left", WIDTH, HEIGHT, polygon=[[-20, 0], [-10, 0], [-10, 10]])
+        with self.assertRaises(ValueError):
+            LumaRegion("inverted", WIDTH, HEIGHT, rect=(20, 10, 10, 20))
+
+    def test_polygon_missed_by_the_stride_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LumaRegion("thin", WIDTH, HEIGHT, polygon=[[1, 0], [0, 1]], stride=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
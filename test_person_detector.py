@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from person_detector import AsyncDetector, iou
+
+
+class IouTest(unittest.TestCase):
+    def test_pairwise_overlaps(self):
+        a = [(0, 0, 10, 10), (20, 20, 30, 30)]
+        b = [(0, 0, 10, 10), (5, 0, 15, 10), (100, 100, 110, 110)]
+        np.testing.assert_allclose(iou(a, b), [[1.0, 50 / 150, 0.0], [0.0, 0.0, 0.0]])
+
+    def test_degenerate_boxes_do_not_divide_by_zero(self):
+        self.assertEqual(iou([(5, 5, 5, 5)], [(5, 5, 5, 5)])[0, 0], 0.0)
+
+
+class RecordingDetector:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def detect_batch(self, frames):
+        self.batches.append(len(frames))
+        return [[(0, 0, int(frame[0, 0, 0]), 1)] for frame in frames]
+
+
+class AsyncDetectorTest(unittest.TestCase):
+    def frame(self, value):
+        return np.full((4, 4, 3), value, dtype=np.uint8)
+
+    def wait_results(self, clients):
+        results = {}
+        while len(results) < len(clients):
+            for client in clients:
+                boxes = client.poll()
+                if boxes is not None:
+                    results[client] = boxes
+        return [results[client] for client in clients]
+
+    def test_a_round_of_refresh_frames_is_one_batch(self):
+        detector = RecordingDetector()
+        service = AsyncDetector(detector)
+        clients = [service.client() for _ in range(3)]
+        for (value, client) in zip((10, 20, 30), clients):
+            client.submit(self.frame(value))
+
+        self.assertEqual(self.wait_results(clients), [[(0, 0, 10, 1)], [(0, 0, 20, 1)], [(0, 0, 30, 1)]])
+        self.assertEqual(detector.batches, [3])
+        service.stop()
+
+    def test_flush_sends_a_partial_round(self):
+        detector = RecordingDetector()
+        service = AsyncDetector(detector)
+        clients = [service.client() for _ in range(3)]
+        clients[0].submit(self.frame(10))
+        clients[2].submit(self.frame(30))
+        self.assertEqual(detector.batches, [])
+        service.flush()
+
+        self.wait_results([clients[0], clients[2]])
+        self.assertEqual(detector.batches, [2])
+        self.assertFalse(clients[1].busy())
+        service.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import importlib.util
+import os
+import tempfile
+import time
+import unittest
+from threading import Lock
+
+from bounded_queue import BoundedQueue
+from telemetry import EntryTelemetry, TelemetrySender, TelemetryType, TelemetryWrapper
+from telemetry_spool import TelemetrySpool
+from telemetry_transport import PublishResult, TelemetryTransport, ThingsBoardTransport
+
+TIMEOUT = 5.0
+
+
+class FastSender(TelemetrySender):
+    RECONNECT_POLL = 0.02
+
+
+class FlakyTransport(TelemetryTransport):
+    def __init__(self) -> None:
+        self.connected = False
+        self.failures = 0
+        self.attempts = 0
+        self.published = []
+        self.lock = Lock()
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def publish(self, telemetry_type, batch):
+        with self.lock:
+            self.attempts += 1
+            if self.failures > 0:
+                self.failures -= 1
+                return PublishResult(False)
+            self.published.extend(wrapped.telemetry.direction for wrapped in batch)
+            return PublishResult()
+
+
+def entry(direction):
+    return TelemetryWrapper(TelemetryType.T_ENTRY, EntryTelemetry("2024-01-01 12:00:00", direction))
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+class TelemetrySpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "spool.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_retry_resends_only_the_failed_rows_and_ack_deletes(self):
+        spool = TelemetrySpool(self.path)
+        spool.append(["a", "b", "c"])
+        rows = spool.next_batch(2)
+        self.assertEqual([payload for (_, payload) in rows], ["a", "b"])
+        in_flight = spool.next_batch(2)
+        self.assertEqual([payload for (_, payload) in in_flight], ["c"])
+        self.assertFalse(spool.backlog())
+
+        spool.retry([i for (i, _) in rows])
+        spool.append(["d"])
+        self.assertTrue(spool.backlog())
+        # "c" is still in flight, only the failed rows and the new one are handed out
+        rows = spool.next_batch(3)
+        self.assertEqual([payload for (_, payload) in rows], ["a", "b", "d"])
+        self.assertFalse(spool.backlog())
+        spool.ack([i for (i, _) in rows + in_flight])
+        self.assertEqual(spool.size(), 0)
+        spool.close()
+
+    def test_offline_events_are_spooled_retried_and_acked(self):
+        transport = FlakyTransport()
+        queue = BoundedQueue()
+        sender = FastSender(transport, queue, batch_size=2, flush_interval=0.01, spool_path=self.path)
+        for direction in ("up", "down", "up"):
+            queue.put(entry(direction))
+        wait_for(lambda: sender.spool.size() == 3)
+        self.assertEqual(transport.attempts, 0)
+
+        # the first publish after reconnecting fails and must be retried from the spool
+        transport.failures = 1
+        transport.connected = True
+        wait_for(lambda: sender.spool.size() == 0)
+        sender.stop()
+
+        # the last event can be published while the failed batch waits for its retry
+        self.assertEqual(sorted(transport.published), ["down", "up", "up"])
+        self.assertEqual(sender.sent, 3)
+        self.assertEqual(sender.failed, 2)
+
+    def test_spool_is_replayed_after_a_restart(self):
+        transport = FlakyTransport()
+        queue = BoundedQueue()
+        sender = FastSender(transport, queue, spool_path=self.path)
+        queue.put(entry("up"))
+        wait_for(lambda: sender.spool.size() == 1)
+        sender.stop()
+
+        transport = FlakyTransport()
+        transport.connected = True
+        sender = FastSender(transport, BoundedQueue(), spool_path=self.path)
+        wait_for(lambda: sender.spool.size() == 0)
+        sender.stop()
+        self.assertEqual(transport.published, ["up"])
+
+
+class TelemetryTransportTest(unittest.TestCase):
+    def test_transports_must_implement_publish(self):
+        class Silent(TelemetryTransport):
+            pass
+
+        with self.assertRaises(TypeError):
+            Silent()
+        FlakyTransport()
+
+
+class FakeMqttClient:
+    def __init__(self, failures) -> None:
+        self.failures = failures
+        self.connected = False
+
+    def connect(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionRefusedError(111, "Connection refused")
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+
+@unittest.skipUnless(importlib.util.find_spec("tb_device_mqtt"), "tb_device_mqtt is not installed")
+class ThingsBoardTransportTest(unittest.TestCase):
+    def test_connect_keeps_retrying_an_unreachable_broker(self):
+        transport = ThingsBoardTransport("localhost", ["entry"], "luma")
+        transport.clients = {"entry": FakeMqttClient(2), "luma": FakeMqttClient(0)}
+        transport.RECONNECT_DELAY = 0.02
+
+        transport.connect()
+        self.assertFalse(transport.is_connected())
+        wait_for(transport.is_connected)
+        transport.disconnect()
+        self.assertFalse(transport.is_connected())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +0,0 @@
-class TrackableObject:
-	def __init__(self, objectID, centroid):
-		self.objectID = objectID
-		self.centroids = [centroid]
-		self.counted = False
\ No newline at end of file